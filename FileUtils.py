@@ -7,21 +7,277 @@
 # ----------------------------------------------------------------------
 
 import os.path
-import glob
+import ctypes
+import ctypes.util
+import hashlib
+import struct
+import weakref
+from collections import OrderedDict
+
+# ----------------------------------------------------------------------
+
+# bytes removed by FileInfo.contentsOf so only ASCII characters not including 0 are left
+_nonASCIIBytes = bytes([0]) + bytes(range(128, 256))
+
+
+def asciiContents(data: bytes) -> str:
+    """
+    :param data: bytes such as read from a file
+    :return: string of the ASCII characters in data not including 0
+    """
+    return data.translate(None, _nonASCIIBytes).decode('ascii')
+
+# ----------------------------------------------------------------------
+
+def directoryContentHash(dirPath: str) -> str:
+    """
+    hashes the names and contents of every file in the directory and its subdirectories (including hidden files)
+    so directories with the same contents have the same hash regardless of modification times
+    :param dirPath: path for the directory
+    :return: SHA-256 hex digest
+    """
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(dirPath):
+        # sort so the order os.walk returns them in does not matter
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            relativePath = os.path.relpath(path, dirPath)
+            digest.update(os.fsencode(relativePath) + b"\0")
+            if os.path.islink(path):
+                digest.update(b"link\0" + os.fsencode(os.readlink(path)) + b"\0")
+                continue
+            fileDigest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    fileDigest.update(chunk)
+            digest.update(fileDigest.digest())
+    return digest.hexdigest()
+
+# ----------------------------------------------------------------------
+
+def defaultCachePath(filename: str) -> str:
+    """
+    :param filename: name of the cache file such as rosters.pickle
+    :return: path for the cache file in $XDG_CACHE_HOME/SharedScripts (~/.cache/SharedScripts if it is not set)
+    """
+    cacheDir = os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(cacheDir, "SharedScripts", filename)
+
+
+def writeFileAtomically(filePath: str, write, binary: bool = False) -> None:
+    """
+    writes to a temporary file in the same directory (creating the directory if needed) and renames it to filePath
+    so another process never reads a partially written file; raises OSError if it cannot be written
+    :param filePath: path for the file (can be just a filename)
+    :param write: function called with the open temporary file to write the contents
+    :param binary: if True, the file is opened in binary mode (such as for pickle)
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(filePath)), exist_ok=True)
+    tempPath = f"{filePath}.{os.getpid()}"
+    try:
+        with open(tempPath, "wb" if binary else "w") as outfile:
+            write(outfile)
+        os.replace(tempPath, filePath)
+    except BaseException:
+        if os.path.exists(tempPath):
+            os.remove(tempPath)
+        raise
+
+# ----------------------------------------------------------------------
+
+class ContentCache:
+    "least recently used cache of file contents that holds at most maxBytes characters"
+
+    def __init__(self, maxBytes: int):
+        """
+        :param maxBytes: maximum total length of the contents in the cache
+        """
+        self._maxBytes = maxBytes
+        self._bytes = 0
+        # keys are file paths and values are ((mtime, size), contents)
+        self._entries = OrderedDict()
+
+    def get(self, filePath: str, signature: tuple):
+        """
+        :param filePath: path of the file
+        :param signature: (mtime, size) of the file now so changed files are not returned
+        :return: contents of the file or None if not in the cache
+        """
+        entry = self._entries.get(filePath)
+        if entry is None or entry[0] != signature:
+            return None
+        self._entries.move_to_end(filePath)
+        return entry[1]
+
+    def put(self, filePath: str, signature: tuple, contents: str):
+        """
+        adds the contents of the file removing the least recently used files if over maxBytes
+        """
+        self.invalidate(filePath)
+        if len(contents) > self._maxBytes:
+            return
+        self._entries[filePath] = (signature, contents)
+        self._bytes += len(contents)
+        while self._bytes > self._maxBytes:
+            path, (signature, removed) = self._entries.popitem(last=False)
+            self._bytes -= len(removed)
+
+    def invalidate(self, filePath: str):
+        "removes the file from the cache"
+        entry = self._entries.pop(filePath, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def setMaxBytes(self, maxBytes: int):
+        self._maxBytes = maxBytes
+        while self._bytes > self._maxBytes:
+            path, (signature, removed) = self._entries.popitem(last=False)
+            self._bytes -= len(removed)
+
+    def size(self) -> int:
+        "returns total length of the contents in the cache"
+        return self._bytes
+
+
+# used by FileInfo.contentsOf for every FileInfo object
+contentCache = ContentCache(64 * 1024 * 1024)
+
+# ----------------------------------------------------------------------
+
+class _InotifyWatcher:
+    "Linux inotify (using ctypes) shared by a watched DirectoryInfo and its subdirectories"
+
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_MOVE_SELF = 0x800
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ONLYDIR = 0x1000000
+    _mask = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+    # struct inotify_event: int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[len]
+    _eventHeader = struct.Struct("iIII")
+
+    def __init__(self):
+        "raises OSError if inotify is not available (such as not on Linux)"
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self._libc = libc
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # keys are watch descriptors and values are weak references to the DirectoryInfo objects
+        # so a DirectoryInfo dropped without stopWatching is still freed (and __del__ closes the descriptor)
+        self._watches = {}
+
+    def addWatch(self, directoryInfo) -> int:
+        """
+        :param directoryInfo: DirectoryInfo to send the events for its directory to
+        :return: watch descriptor (raises OSError if the watch can not be added such as too many watches)
+        """
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(str(directoryInfo)), self._mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"unable to watch {directoryInfo}")
+        self._watches[wd] = weakref.ref(directoryInfo)
+        return wd
+
+    def removeWatch(self, wd: int):
+        if self._watches.pop(wd, None) is not None:
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def close(self):
+        self._watches.clear()
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __del__(self):
+        # only reached if the DirectoryInfo that created it was dropped without calling stopWatching
+        if getattr(self, "_fd", -1) >= 0:
+            self.close()
+
+    def processEvents(self):
+        "reads the events that have happened without waiting and updates the DirectoryInfo objects"
+        data = b""
+        while True:
+            try:
+                chunk = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            if len(chunk) == 0:
+                break
+            data += chunk
+
+        pos = 0
+        while pos < len(data):
+            wd, mask, cookie, length = self._eventHeader.unpack_from(data, pos)
+            pos += self._eventHeader.size
+            name = os.fsdecode(data[pos:pos + length].rstrip(b"\0"))
+            pos += length
+            if mask & self.IN_Q_OVERFLOW:
+                # events were lost so read every watched directory again
+                for reference in list(self._watches.values()):
+                    directoryInfo = reference()
+                    if directoryInfo is not None:
+                        directoryInfo._reconcile()
+            elif mask & self.IN_IGNORED:
+                # directory was removed or the watch was removed
+                self._watches.pop(wd, None)
+            elif wd in self._watches:
+                directoryInfo = self._watches[wd]()
+                if directoryInfo is not None:
+                    directoryInfo._applyEvent(mask, name)
 
 # ----------------------------------------------------------------------
 
 class DirectoryInfo:
     "class for accessing contents of a directory"
 
-    def __init__(self, dirPath, *args):
+    def __init__(self, dirPath, *args, recursive: bool = False, watch: bool = False, _watcher=None, _poll: bool = False):
         """
         :param dirPath: path for the directory
         :param args: any additional directories to add onto end of path
+        :param recursive: if True, also keep a DirectoryInfo for each subdirectory (see subdirectory and refresh)
+        :param watch: if True, keep the contents current using inotify events (or by calling refresh
+        before answering if inotify is not available) so files(), directories(), etc. do not need updateFileInfo
         """
         self._dirPath = os.path.join(dirPath, *args)
+        self._recursive = recursive
+        self._watch = watch
+        # subdirectories share the _InotifyWatcher of the DirectoryInfo that created them (which closes it)
+        self._watcher = _watcher
+        self._ownsWatcher = False
+        self._wd = None
+        # _poll is True for subdirectories of a directory using refresh instead of inotify
+        if watch and not _poll:
+            try:
+                if self._watcher is None:
+                    self._watcher = _InotifyWatcher()
+                    self._ownsWatcher = True
+                # watch before reading the directory so no changes are missed
+                self._wd = self._watcher.addWatch(self)
+            except (OSError, AttributeError):
+                self._wd = None
+                if self._ownsWatcher:
+                    self._watcher.close()
+                    self._watcher = None
+                    self._ownsWatcher = False
         self._files = set()
         self._directories = set()
+        # keys are the paths in _files and _directories
+        self._entries = {}
+        # keys are the paths in _directories if recursive
+        self._subdirectories = {}
+        # modification time of the directory when it was last read
+        self._mtime = None
         self.updateFileInfo()
 
     def __str__(self) -> str:
@@ -29,21 +285,171 @@ class DirectoryInfo:
 
     def updateFileInfo(self):
         "refresh the contents of the directory"
+        self._scan()
+        if self._recursive:
+            for subdirectory in self._subdirectories.values():
+                subdirectory.stopWatching()
+            self._subdirectories = {d: self._newSubdirectory(d) for d in self._realDirectories()}
+
+    def _newSubdirectory(self, path):
+        return DirectoryInfo(path, recursive=True, watch=self._watch, _watcher=self._watcher, _poll=self._watcher is None)
+
+    def _scan(self):
+        """
+        reads the directory with os.scandir which provides whether each entry is a directory
+        without a separate stat for each entry
+        """
         self._files.clear()
         self._directories.clear()
-        allFiles = glob.glob(f"{self._dirPath}/*")
-        for f in allFiles:
-            if os.path.isdir(f):
-                self._directories.add(f)
-            else:
-                self._files.add(f)
+        self._entries.clear()
+        try:
+            self._mtime = os.stat(self._dirPath).st_mtime_ns
+            with os.scandir(self._dirPath) as it:
+                for entry in it:
+                    # glob did not include hidden files so skip them
+                    if entry.name.startswith("."):
+                        continue
+                    self._entries[entry.path] = entry
+                    if entry.is_dir():
+                        self._directories.add(entry.path)
+                    else:
+                        self._files.add(entry.path)
+        except (FileNotFoundError, NotADirectoryError):
+            self._mtime = None
+
+    def _realDirectories(self) -> list:
+        "returns the directories that are not symbolic links (so a recursive snapshot can not loop)"
+        return [d for d in self._directories if not self._entries[d].is_symlink()]
+
+    def refresh(self):
+        """
+        re-reads the directory only if its modification time changed (files or directories added, removed, or renamed);
+        if recursive, refreshes each subdirectory the same way so only directories that changed are read
+        """
+        try:
+            mtime = os.stat(self._dirPath).st_mtime_ns
+        except (FileNotFoundError, NotADirectoryError):
+            mtime = None
+        if mtime != self._mtime or mtime is None:
+            self._reconcile()
+        if self._recursive:
+            for subdirectory in self._subdirectories.values():
+                subdirectory.refresh()
+
+    def _reconcile(self):
+        "reads the directory again keeping the DirectoryInfo for subdirectories that are still here"
+        self._scan()
+        if self._recursive:
+            directories = self._realDirectories()
+            for path, subdirectory in self._subdirectories.items():
+                if path not in directories:
+                    subdirectory.stopWatching()
+            self._subdirectories = {d: self._subdirectories.get(d) or self._newSubdirectory(d) for d in directories}
+
+    def _applyEvent(self, mask: int, name: str):
+        "updates the contents for an inotify event for a file or directory in this directory"
+        if mask & (_InotifyWatcher.IN_DELETE_SELF | _InotifyWatcher.IN_MOVE_SELF):
+            # the watch no longer matches the path (a moved directory is still watched at its new path)
+            # so keep the contents current with refresh instead
+            self._stopInotify()
+            return
+        # glob did not include hidden files so skip them
+        if name == "" or name.startswith("."):
+            return
+        path = os.path.join(self._dirPath, name)
+        if mask & (_InotifyWatcher.IN_CREATE | _InotifyWatcher.IN_MOVED_TO):
+            # a stat only for the new entry (follows symbolic links like os.scandir's is_dir)
+            isDir = os.path.isdir(path)
+            self._files.discard(path)
+            self._directories.discard(path)
+            (self._directories if isDir else self._files).add(path)
+            # no os.DirEntry for entries added by an event
+            self._entries[path] = None
+            if self._recursive and isDir and not os.path.islink(path) and path not in self._subdirectories:
+                self._subdirectories[path] = self._newSubdirectory(path)
+        elif mask & (_InotifyWatcher.IN_DELETE | _InotifyWatcher.IN_MOVED_FROM):
+            self._files.discard(path)
+            self._directories.discard(path)
+            self._entries.pop(path, None)
+            subdirectory = self._subdirectories.pop(path, None)
+            if subdirectory is not None:
+                subdirectory.stopWatching()
+
+    def _update(self):
+        "brings the contents up to date if watching"
+        if self._watch:
+            if self._wd is not None:
+                self._watcher.processEvents()
+            # processEvents stops using inotify if this directory was removed or moved
+            if self._wd is None:
+                self.refresh()
+
+    def isWatching(self) -> bool:
+        "returns True if inotify is keeping the contents current (False if not watching or polling with refresh)"
+        # pending events may show the directory was moved or removed
+        self._update()
+        return self._wd is not None
+
+    def _stopInotify(self):
+        "removes the inotify watches of this directory and its subdirectories and closes inotify if this created it"
+        if self._wd is not None:
+            self._watcher.removeWatch(self._wd)
+            self._wd = None
+        for subdirectory in self._subdirectories.values():
+            subdirectory._stopInotify()
+        if self._ownsWatcher:
+            self._watcher.close()
+            self._ownsWatcher = False
+        self._watcher = None
+
+    def stopWatching(self):
+        "stops watching this directory and its subdirectories"
+        self._stopInotify()
+        self._watch = False
+        for subdirectory in self._subdirectories.values():
+            subdirectory.stopWatching()
+
+    def entry(self, path) -> os.DirEntry:
+        """
+        :param path: path of a file or directory in this directory (from files() or directories())
+        :return: os.DirEntry for it which caches its stat data (None if added by a watch event)
+        """
+        self._update()
+        return self._entries[path]
+
+    def stat(self, path) -> os.stat_result:
+        """
+        :param path: path of a file or directory in this directory (from files() or directories())
+        :return: stat data for it (cached after the first call until the directory is read again)
+        """
+        self._update()
+        entry = self._entries[path]
+        return entry.stat() if entry is not None else os.stat(path)
+
+    def subdirectory(self, path):
+        """
+        :param path: path of a directory in this directory (from directories())
+        :return: DirectoryInfo for the directory (only if this DirectoryInfo is recursive and it is not a symbolic link)
+        """
+        self._update()
+        return self._subdirectories[path]
+
+    def allFiles(self) -> set:
+        "returns set of files in the directory and, if recursive, all its subdirectories"
+        self._update()
+        result = set(self._files)
+        for subdirectory in self._subdirectories.values():
+            result.update(subdirectory.allFiles())
+        return result
 
     def directories(self) -> set:
         "returns set of directories in the directory"
+        self._update()
         return self._directories
 
     def files(self) -> set:
         "returns set of files (not including any directories) in the directory"
+        self._update()
         return self._files
 
     def __contains__(self, name) -> bool:
@@ -53,6 +459,7 @@ class DirectoryInfo:
         """
         if isinstance(name, FileInfo):
             name = str(name)
+        self._update()
         return name in self._files or name in self._directories
 
     def containsFile(self, filename):
@@ -60,6 +467,7 @@ class DirectoryInfo:
         :param filename: filename to check if exists here
         :return: True if name is a file in this directory, False otherwise
         """
+        self._update()
         return filename in self._files
 
     def containsDirectory(self, directory):
@@ -67,6 +475,7 @@ class DirectoryInfo:
         :param directory: directory name to check if exists here
         :return: True if name is a directory in this directory, False otherwise
         """
+        self._update()
         return directory in self._directories
 
 # ----------------------------------------------------------------------
@@ -132,7 +541,6 @@ class FileInfo:
         :param args: any additional directories and filename to add onto end of path
         """
         self._filePath = os.path.join(filePath, *args)
-        self._contents = None
 
     def __str__(self) -> str:
         return self._filePath
@@ -161,19 +569,37 @@ class FileInfo:
         return FileInfo.extensionForFilePath(self._filePath)
 
     def contentsOf(self) -> str:
-        """returns data in the file or empty string if file does not exist"""
-        if self._contents is None:
-            if os.path.exists(self._filePath):
-                with open(self._filePath, 'rb') as f:
-                    try:
-                        s = f.read()
-                        # limit to only ASCII characters not including 0
-                        self._contents = "".join([chr(x) for x in s if 0 < x < 128])
-                    except:
-                        print(f"error reading {self}")
-            else:
-                self._contents = ""
-        return self._contents
+        """returns data in the file or empty string if file does not exist
+        (limited to only ASCII characters not including 0 and cached in contentCache)"""
+        try:
+            stat = os.stat(self._filePath)
+        except OSError:
+            return ""
+        signature = (stat.st_mtime_ns, stat.st_size)
+        contents = contentCache.get(self._filePath, signature)
+        if contents is None:
+            with open(self._filePath, 'rb') as f:
+                try:
+                    contents = asciiContents(f.read())
+                except:
+                    print(f"error reading {self}")
+                    return None
+            contentCache.put(self._filePath, signature, contents)
+        return contents
+
+    def contentsInChunks(self, chunkSize: int = 1024 * 1024):
+        """generator for the data in the file a chunk at a time (limited to only ASCII characters not including 0)
+        without reading the whole file or caching it; nothing is generated if the file does not exist
+        :param chunkSize: number of bytes to read at a time
+        """
+        if not os.path.exists(self._filePath):
+            return
+        with open(self._filePath, 'rb') as f:
+            while True:
+                data = f.read(chunkSize)
+                if len(data) == 0:
+                    break
+                yield asciiContents(data)
 
     def cpInfo(self):
         """
@@ -218,6 +644,7 @@ class FileInfo:
         :param newContents: string to write to the file
         :return: None
         """
+        contentCache.invalidate(self._filePath)
         with open(self._filePath, 'w') as f:
             f.write(newContents)
 
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+# ----------------------------------------------------------------------
+# Profiler.py
+# Dave Reed
+# 10/17/2026
+# ----------------------------------------------------------------------
+
+import contextlib
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from typing import Dict, Optional
+
+# ----------------------------------------------------------------------
+
+# shared so NullProfiler.stage does not create anything
+_nullContext = contextlib.nullcontext()
+
+
+class NullProfiler:
+    """
+    used when profiling is off; every method does nothing so the code being measured can call them unconditionally
+    (check enabled before computing anything only the profiler needs, such as file sizes)
+    """
+
+    enabled = False
+
+    def start(self):
+        pass
+
+    def stage(self, name: str):
+        return _nullContext
+
+    def addBytes(self, name: str, count: int):
+        pass
+
+    def count(self, name: str, n: int = 1):
+        pass
+
+    def finish(self):
+        pass
+
+# ----------------------------------------------------------------------
+
+class Profiler:
+    """
+    records the wall time and bytes for each named stage and named counters, optionally running cProfile
+    or tracemalloc from start to finish, and writes a JSON report; safe to use from several threads
+    """
+
+    enabled = True
+
+    def __init__(self, reportPath: str, useCProfile: bool = False, useTracemalloc: bool = False):
+        """
+        :param reportPath: path of the JSON report written by finish
+        :param useCProfile: if True, include the functions with the most cumulative time in the report
+        :param useTracemalloc: if True, include the peak memory and largest allocations in the report
+        """
+        self._reportPath = reportPath
+        self._useCProfile = useCProfile
+        self._useTracemalloc = useTracemalloc
+        self._lock = threading.Lock()
+        self._stages: Dict[str, dict] = {}
+        self._counters: Dict[str, int] = {}
+        self._cProfile: Optional[cProfile.Profile] = None
+        self._start = None
+
+    def start(self):
+        self._start = time.perf_counter()
+        if self._useTracemalloc:
+            tracemalloc.start()
+        if self._useCProfile:
+            self._cProfile = cProfile.Profile()
+            self._cProfile.enable()
+
+    def _stageInfo(self, name: str) -> dict:
+        # caller must hold the lock
+        return self._stages.setdefault(name, {"seconds": 0.0, "calls": 0, "bytes": 0})
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """
+        context manager that adds the time inside it to the stage (a stage can be entered more than once)
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                info = self._stageInfo(name)
+                info["seconds"] += seconds
+                info["calls"] += 1
+
+    def addBytes(self, name: str, count: int):
+        """
+        adds count to the bytes read or written by the stage
+        """
+        with self._lock:
+            self._stageInfo(name)["bytes"] += count
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def report(self) -> dict:
+        with self._lock:
+            report = {"seconds": time.perf_counter() - self._start if self._start is not None else None,
+                      "stages": {name: dict(info) for name, info in self._stages.items()},
+                      "counters": dict(self._counters)}
+        if self._useTracemalloc and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics("lineno")[:20]
+            report["tracemalloc"] = {"peakBytes": peak, "currentBytes": current,
+                                     "top": [{"location": str(stat.traceback), "bytes": stat.size, "count": stat.count}
+                                             for stat in top]}
+        if self._cProfile is not None:
+            stats = pstats.Stats(self._cProfile, stream=io.StringIO())
+            stats.sort_stats("cumulative")
+            functions = []
+            # fcn_list is the sorted order from sort_stats
+            for function in stats.fcn_list[:30]:
+                callCount, primitiveCalls, totalTime, cumulativeTime, callers = stats.stats[function]
+                filename, line, functionName = function
+                functions.append({"function": f"{filename}:{line}({functionName})", "calls": callCount,
+                                  "totalSeconds": totalTime, "cumulativeSeconds": cumulativeTime})
+            report["cProfile"] = functions
+        return report
+
+    def finish(self):
+        """
+        stops cProfile and tracemalloc and writes the report
+        """
+        if self._cProfile is not None:
+            self._cProfile.disable()
+        report = self.report()
+        if self._useTracemalloc:
+            tracemalloc.stop()
+        with open(self._reportPath, "w") as outfile:
+            json.dump(report, outfile, indent=2)
+        print(f"profile written to {self._reportPath}")
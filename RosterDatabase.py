@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+
+# ----------------------------------------------------------------------
+# RosterDatabase.py
+# Dave Reed
+# 10/17/2026
+# ----------------------------------------------------------------------
+
+from __future__ import annotations
+from argparse import ArgumentParser
+from typing import List, Optional, Tuple
+
+import os
+import os.path
+import sqlite3
+
+
+_schema = """
+CREATE TABLE IF NOT EXISTS students (
+    id INTEGER PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    firstName TEXT NOT NULL,
+    lastName TEXT NOT NULL,
+    -- lowercase "first last" for findStudentByName
+    fullName TEXT NOT NULL,
+    -- lowercase lastfirst that Canvas uses to start submission filenames
+    submissionKey TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS studentsFullName ON students (fullName);
+CREATE INDEX IF NOT EXISTS studentsLastName ON students (lastName COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS studentsSubmissionKey ON students (submissionKey);
+
+CREATE TABLE IF NOT EXISTS courses (
+    id INTEGER PRIMARY KEY,
+    semester TEXT NOT NULL,
+    name TEXT NOT NULL,
+    rosterFilename TEXT NOT NULL,
+    UNIQUE (semester, name)
+);
+
+CREATE TABLE IF NOT EXISTS enrollments (
+    courseId INTEGER NOT NULL REFERENCES courses (id) ON DELETE CASCADE,
+    studentId INTEGER NOT NULL REFERENCES students (id),
+    position INTEGER NOT NULL,
+    PRIMARY KEY (courseId, studentId)
+);
+CREATE INDEX IF NOT EXISTS enrollmentsStudent ON enrollments (studentId);
+"""
+
+
+def semesterForRosterFile(filename: str) -> str:
+    """
+    :param filename: path to roster file such as ~/Private/Grades/Fall2022/CS160-12/roster.csv
+    :return: name of the directory above the course directory (Fall2022 for the example)
+    """
+    return os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(filename))))
+
+# ----------------------------------------------------------------------
+
+
+class RosterDatabase:
+    """
+    SQLite database of the students in each course for any number of semesters;
+    RosterInfo.readRostersFromDatabase uses it so lookups only read the courses they need
+    """
+
+    def __init__(self, dbPath: str):
+        """
+        :param dbPath: path to the SQLite database file (created if it does not exist)
+        """
+        self._dbPath = dbPath
+        self._connection = sqlite3.connect(dbPath)
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        self._connection.executescript(_schema)
+
+    def __str__(self) -> str:
+        return self._dbPath
+
+    def close(self):
+        self._connection.close()
+
+    # ------------------------------------------------------------------
+
+    def importRoster(self, semester: str, course: str, filename: str, rows: List[Tuple[str, str, str]]):
+        """
+        replaces the students in the course with rows
+        :param semester: semester such as Fall2022
+        :param course: course with section such as CS160-12
+        :param filename: roster file the rows were read from
+        :param rows: list of (firstName, lastName, email) such as from RosterInfo.readRosterRows
+        """
+        with self._connection:
+            self._importRoster(semester, course, filename, rows)
+
+    def importRosters(self, courseAndFilenames: tuple, semester: Optional[str] = None):
+        """
+        reads each roster file and replaces the students in its course using a single transaction
+        :param courseAndFilenames: ((courseName, pathToRosterFile), (courseName, pathToRosterFile), ...)
+        :param semester: semester for all the courses or None to use semesterForRosterFile for each one
+        """
+        from RosterInfo import RosterInfo
+        with self._connection:
+            for course, filename in courseAndFilenames:
+                courseSemester = semester if semester is not None else semesterForRosterFile(filename)
+                self._importRoster(courseSemester, course, filename, RosterInfo.readRosterRows(filename))
+
+    def _importRoster(self, semester: str, course: str, filename: str, rows: List[Tuple[str, str, str]]):
+        cursor = self._connection.cursor()
+        cursor.execute("INSERT INTO courses (semester, name, rosterFilename) VALUES (?, ?, ?) "
+                       "ON CONFLICT (semester, name) DO UPDATE SET rosterFilename = excluded.rosterFilename",
+                       (semester, course, filename))
+        courseId = cursor.execute("SELECT id FROM courses WHERE semester = ? AND name = ?",
+                                  (semester, course)).fetchone()[0]
+
+        cursor.executemany("INSERT INTO students (email, firstName, lastName, fullName, submissionKey) "
+                           "VALUES (?, ?, ?, ?, ?) ON CONFLICT (email) DO UPDATE SET "
+                           "firstName = excluded.firstName, lastName = excluded.lastName, "
+                           "fullName = excluded.fullName, submissionKey = excluded.submissionKey",
+                           [(email, firstName, lastName, f"{firstName} {lastName}".lower(),
+                             f"{lastName}{firstName}".lower()) for firstName, lastName, email in rows])
+
+        # position keeps the students in the same order as the roster file
+        cursor.execute("DELETE FROM enrollments WHERE courseId = ?", (courseId,))
+        cursor.executemany("INSERT OR IGNORE INTO enrollments (courseId, studentId, position) "
+                           "SELECT ?, id, ? FROM students WHERE email = ?",
+                           [(courseId, position, email) for position, (firstName, lastName, email) in enumerate(rows)])
+
+    # ------------------------------------------------------------------
+
+    def semesters(self) -> List[str]:
+        return [row[0] for row in self._connection.execute("SELECT DISTINCT semester FROM courses ORDER BY semester")]
+
+    def courses(self, semester: str) -> List[Tuple[str, str]]:
+        """
+        :param semester: semester such as Fall2022
+        :return: list of (courseName, pathToRosterFile) for the semester
+        """
+        return self._connection.execute("SELECT name, rosterFilename FROM courses WHERE semester = ? ORDER BY id",
+                                        (semester,)).fetchall()
+
+    def courseRows(self, semester: str, course: str) -> List[Tuple[str, str, str]]:
+        """
+        :return: list of (firstName, lastName, email) for the students in the course in roster order
+        """
+        return self._connection.execute("SELECT s.firstName, s.lastName, s.email FROM students s "
+                                        "JOIN enrollments e ON e.studentId = s.id "
+                                        "JOIN courses c ON c.id = e.courseId "
+                                        "WHERE c.semester = ? AND c.name = ? ORDER BY e.position",
+                                        (semester, course)).fetchall()
+
+    # ------------------------------------------------------------------
+
+    def _emails(self, condition: str, parameters: tuple, semester: Optional[str]) -> List[str]:
+        query = f"SELECT DISTINCT s.email FROM students s WHERE {condition}"
+        if semester is not None:
+            query += (" AND s.id IN (SELECT e.studentId FROM enrollments e JOIN courses c ON c.id = e.courseId "
+                      "WHERE c.semester = ?)")
+            parameters += (semester,)
+        return [row[0] for row in self._connection.execute(query, parameters)]
+
+    def emailsWithFullName(self, fullName: str, semester: Optional[str] = None) -> List[str]:
+        """
+        :param fullName: first and last name separated by a space (case does not matter)
+        :return: emails of the students with that name
+        """
+        return self._emails("s.fullName = ?", (fullName.lower(),), semester)
+
+    def emailsWithLastName(self, lastName: str, semester: Optional[str] = None) -> List[str]:
+        """
+        :return: emails of every student with the last name (case does not matter)
+        """
+        return self._emails("s.lastName = ? COLLATE NOCASE", (lastName,), semester)
+
+    def submissionKeyMatches(self, user: str, semester: str) -> List[Tuple[str, str]]:
+        """
+        like Course.studentMatchingLastNameFirstName, only the longest lastfirst that is a prefix of user is used
+        :param user: lastfirst at the start of a Canvas submission filename
+        :param semester: semester such as Fall2022
+        :return: list of (email, courseName) for each course in semester of each student with that lastfirst
+        """
+        user = user.lower()
+        prefixes = tuple(user[:length] for length in range(len(user), 0, -1))
+        if len(prefixes) == 0:
+            return []
+        placeholders = ", ".join("?" * len(prefixes))
+        rows = self._connection.execute("SELECT s.submissionKey, s.email, c.name FROM students s "
+                                        "JOIN enrollments e ON e.studentId = s.id "
+                                        "JOIN courses c ON c.id = e.courseId "
+                                        f"WHERE s.submissionKey IN ({placeholders}) AND c.semester = ?",
+                                        prefixes + (semester,)).fetchall()
+        if len(rows) == 0:
+            return []
+        longest = max(len(key) for key, email, course in rows)
+        return [(email, course) for key, email, course in rows if len(key) == longest]
+
+    def studentCount(self, semester: str, courses: List[str]) -> int:
+        """
+        :param courses: names of courses (such as the sections of a course)
+        :return: number of different students in any of the courses
+        """
+        placeholders = ", ".join("?" * len(courses))
+        return self._connection.execute("SELECT COUNT(DISTINCT e.studentId) FROM enrollments e "
+                                        "JOIN courses c ON c.id = e.courseId "
+                                        f"WHERE c.semester = ? AND c.name IN ({placeholders})",
+                                        (semester, *courses)).fetchone()[0]
+
+    def coursesForEmail(self, email: str) -> List[Tuple[str, str]]:
+        """
+        :return: list of (semester, courseName) the student is enrolled in
+        """
+        return self._connection.execute("SELECT c.semester, c.name FROM courses c "
+                                        "JOIN enrollments e ON e.courseId = c.id "
+                                        "JOIN students s ON s.id = e.studentId "
+                                        "WHERE s.email = ? ORDER BY c.semester, c.name", (email,)).fetchall()
+
+# ----------------------------------------------------------------------
+
+
+def main():
+    parser = ArgumentParser(description='import the rosters in the ROSTERS environment variable into a SQLite database')
+    parser.add_argument("-s", "--semester", dest="semester", default=None,
+                        help='semester for the rosters (default is the directory above each course directory)')
+    parser.add_argument("dbPath", help='path to the SQLite database')
+    options = parser.parse_args()
+
+    info = os.getenv("ROSTERS")
+    if info is None:
+        print("ROSTERS environment variable not set")
+        return
+    info = info.split(":")
+    courseAndFilenames = tuple(zip(*(iter(info),) * 2))
+
+    database = RosterDatabase(options.dbPath)
+    database.importRosters(courseAndFilenames, options.semester)
+    for semester in database.semesters():
+        print(semester, " ".join(name for name, filename in database.courses(semester)))
+    database.close()
+
+
+if __name__ == '__main__':
+    main()
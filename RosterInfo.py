@@ -8,14 +8,16 @@
 
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional, Set, Tuple
 
 import re
 import os
 import os.path
 import csv
+import pickle
 import zipfile
-import FileUtils
+from FileUtils import defaultCachePath, writeFileAtomically
+from RosterDatabase import RosterDatabase
 
 
 @dataclass
@@ -24,6 +26,18 @@ class EmailFile:
     filename: str
 
 
+def prefixKeys(s: str, keyDict: Dict[str, list]) -> List[str]:
+    """
+    finds the keys of keyDict that are prefixes of s by looking up each prefix of s
+    so the time depends on the length of s and not on the number of keys
+    :param s: string such as a Canvas lastnamefirstname user (converted to lowercase)
+    :param keyDict: dictionary whose keys are lowercase
+    :return: list of the keys that are prefixes of s, longest first
+    """
+    s = s.lower()
+    return [s[:length] for length in range(len(s), 0, -1) if s[:length] in keyDict]
+
+
 class Student:
 
     firstName: str
@@ -42,15 +56,18 @@ class Student:
     def addCourse(self, course: Course):
         self.courses.append(course)
 
+    def submissionKey(self) -> str:
+        """
+        :return: lowercase lastnamefirstname that Canvas uses to start submission filenames
+        """
+        return f"{self.lastName}{self.firstName}".lower()
+
     def matchesLastNameFirstName(self, s: str) -> bool:
         """
         :param s: string of the form lastnamefirstname
         :return: True if this student matches that or False otherwise
         """
-        s = s.lower()
-        last = self.lastName.lower()
-        first = self.firstName.lower()
-        return s.startswith(last) and s[len(last):].startswith(first)
+        return s.lower().startswith(self.submissionKey())
 
     # ------------------------------------------------------------------
 
@@ -67,17 +84,39 @@ class Course:
     _students: List[Student]
     # keys are lowercase of last name
     _byLastName: Dict[str, List[Student]]
+    # keys are Student.submissionKey() (lowercase lastnamefirstname)
+    _bySubmissionKey: Dict[str, List[Student]]
+
+    # if not None, called the first time the students are needed to read them from the roster
+    _loader: Optional[Callable[[Course], None]]
 
     def __init__(self, courseWithSection, rosterFileName):
         self._name = courseWithSection
         self._rosterFilename = rosterFileName
         self._students = []
         self._byLastName = {}
+        self._bySubmissionKey = {}
+        self._loader = None
+
+    def _ensureLoaded(self):
+        if self._loader is not None:
+            loader = self._loader
+            self._loader = None
+            loader(self)
+
+    def isLoaded(self) -> bool:
+        """
+        :return: True if the students have been read from the roster
+        """
+        return self._loader is None
 
     def clone(self) -> Course:
+        self._ensureLoaded()
         c = Course(self._name, self._rosterFilename)
         c._students = self._students[:]
-        c._byLastName = self._byLastName.copy()
+        # copy the lists too so adding students to the clone (mergedCourse) does not change this course
+        c._byLastName = {key: students[:] for key, students in self._byLastName.items()}
+        c._bySubmissionKey = {key: students[:] for key, students in self._bySubmissionKey.items()}
         return c
 
     def filename(self):
@@ -95,14 +134,47 @@ class Course:
             self._byLastName[s.lastName.lower()].append(s)
         else:
             self._byLastName[s.lastName.lower()] = [s]
+        key = s.submissionKey()
+        if key in self._bySubmissionKey:
+            self._bySubmissionKey[key].append(s)
+        else:
+            self._bySubmissionKey[key] = [s]
 
     def students(self) -> List[Student]:
+        self._ensureLoaded()
         return self._students
 
+    def studentsMatchingLastNameFirstName(self, s: str) -> List[Student]:
+        """
+        :param s: string of the form lastnamefirstname (possibly followed by more characters such as a middle name)
+        :return: list of every student whose lastnamefirstname is a prefix of s (empty if none)
+        """
+        self._ensureLoaded()
+        students = []
+        for key in prefixKeys(s, self._bySubmissionKey):
+            # merged courses can contain the same student from more than one section
+            students.extend(student for student in self._bySubmissionKey[key] if student not in students)
+        return students
+
     def studentMatchingLastNameFirstName(self, s: str) -> Optional[Student]:
-        for student in self._students:
-            if student.matchesLastNameFirstName(s):
-                return student
+        """
+        :param s: string of the form lastnamefirstname (possibly followed by more characters such as a middle initial)
+        :return: the student whose lastnamefirstname is the longest prefix of s (smithjohn for smithjohnq even if
+        smithjo is also a prefix) or None if no student matches or more than one student has that lastnamefirstname
+        """
+        self._ensureLoaded()
+        keys = prefixKeys(s, self._bySubmissionKey)
+        if len(keys) == 0:
+            return None
+        students = []
+        for student in self._bySubmissionKey[keys[0]]:
+            # merged courses can contain the same student from more than one section
+            if student not in students:
+                students.append(student)
+        if len(students) == 1:
+            return students[0]
+        emails = ", ".join(student.email for student in students)
+        print(f"{s} is ambiguous in {self._name}: {emails}")
         return None
 
     def __str__(self) -> str:
@@ -129,42 +201,59 @@ class Course:
                 filename = name + extension
 
             user = path[:firstPos].lower()
-            for student in self._students:
-                if student.matchesLastNameFirstName(user):
-                    return EmailFile(student.email, filename)
-                # lowerLast = student.lastName.lower()
-                # if user.startswith(lowerLast):
-                #     # if last name exists
-                #     if lowerLast in self._byLastName:
-                #         students = self._byLastName[lowerLast]
-                #         # if only one student with this last name, found them
-                #         if len(students) == 1:
-                #             return EmailFile(students[0].email, filename)
-                #         else:
-                #             # remove lastName from beginning of string
-                #             withoutLast = user[len(lowerLast):]
-                #             for s in students:
-                #                 if withoutLast.startswith(s.firstName.lower()):
-                #                     return EmailFile(s.email, filename)
+            student = self.studentMatchingLastNameFirstName(user)
+            if student is not None:
+                return EmailFile(student.email, filename)
         print(f"couldn't match {path}")
         return None
 
 
 # ----------------------------------------------------------------------
 
+# determineCourse treats courses matching at least this fraction of the most submitters as tied
+# since a few students (added or dropped late, or with changed names) may not match the right roster
+_nearlyMostSubmitted = 0.9
+
+# changed whenever the fields of Student, Course, or RosterInfo change so an older cache is not used
+_rosterCacheVersion = 2
+
+
+def defaultRosterCachePath() -> str:
+    """
+    :return: path to use for the cache of the rosters in the ROSTERS environment variable
+    """
+    return defaultCachePath("rosters.pickle")
+
+# ----------------------------------------------------------------------
+
 class RosterInfo:
 
+    # only last names that one student has
     lastNameToStudent: Dict[str, Student]
+    # every student with each last name
+    lastNameToStudents: Dict[str, List[Student]]
     fullNameToStudent: Dict[str, Student]
     emailToStudent: Dict[str, Student]
     _courses: List[Course]
+    # keys are Student.submissionKey() for every student in every loaded course
+    _bySubmissionKey: Dict[str, List[Tuple[Student, Course]]]
+    # roster cache state (not part of the cached object), see readRosters
+    _cache: dict
+    # if not None, the rosters are read from this database (see readRostersFromDatabase)
+    _database: Optional[RosterDatabase]
+    _semester: Optional[str]
 
     def __init__(self):
 
         self.lastNameToStudent = {}
+        self.lastNameToStudents = {}
         self.fullNameToStudent = {}
         self.emailToStudent = {}
         self._courses = []
+        self._bySubmissionKey = {}
+        self._cache = {"path": None}
+        self._database = None
+        self._semester = None
 
     # ------------------------------------------------------------------
 
@@ -173,7 +262,21 @@ class RosterInfo:
 
     # ------------------------------------------------------------------
 
+    def loadAllCourses(self):
+        """
+        reads any rosters that have not been read yet so emailToStudent, fullNameToStudent
+        and lastNameToStudent contain every student
+        """
+        for c in self._courses:
+            c._ensureLoaded()
+
+    # ------------------------------------------------------------------
+
     def findStudentByName(self, fullName: str):
+        if self._database is not None:
+            return self._findStudentByNameInDatabase(fullName)
+
+        self.loadAllCourses()
         # look for paren which may contain what student entered for pronouns
         parenPos = fullName.rfind("(")
         if parenPos != -1:
@@ -198,15 +301,44 @@ class RosterInfo:
             lastName = nameFields[-1]
             if lastName in self.lastNameToStudent:
                 return self.lastNameToStudent[lastName]
+            elif lastName in self.lastNameToStudents:
+                emails = ", ".join(s.email for s in self.lastNameToStudents[lastName])
+                print(f"{firstName} {lastName} not found and more than one student named {lastName}: {emails}")
             else:
                 print(f"{firstName} {lastName} not found")
         print(f"unable to find {fullName}")
 
+    def _findStudentByNameInDatabase(self, fullName: str):
+        # same steps as findStudentByName but using the indexes in the database
+        # and then only reading the rosters for the student that is found
+        parenPos = fullName.rfind("(")
+        if parenPos != -1:
+            fullName = fullName[:parenPos].strip()
+
+        nameFields = fullName.split()
+        emails = self._database.emailsWithFullName(fullName, self._semester)
+        if len(emails) == 0:
+            # remove generation value
+            if nameFields[-1].upper() in ("II", "III", "IV", "JR", "JR."):
+                del nameFields[-1]
+            firstName = nameFields[0]
+            lastName = nameFields[-1]
+            emails = self._database.emailsWithLastName(lastName, self._semester)
+            if len(emails) == 0:
+                print(f"{firstName} {lastName} not found")
+            elif len(emails) > 1:
+                print(f"{firstName} {lastName} not found and more than one student named {lastName}: {', '.join(emails)}")
+
+        if len(emails) == 1:
+            return self.findStudentByEmail(emails[0])
+        print(f"unable to find {fullName}")
+
     # ------------------------------------------------------------------
 
     def courseWithName(self, name: str) -> Optional[Course]:
         for c in self._courses:
             if c.name() == name:
+                c._ensureLoaded()
                 return c
         return None
 
@@ -227,6 +359,18 @@ class RosterInfo:
     # ------------------------------------------------------------------
 
     def findStudentByEmail(self, email):
+        if self._database is not None and email not in self.emailToStudent:
+            # only read the rosters for the courses the student is in
+            for semester, name in self._database.coursesForEmail(email):
+                if semester == self._semester:
+                    self.courseWithName(name)
+            return self.emailToStudent[email]
+
+        # only read rosters until the student is found
+        for c in self._courses:
+            if email in self.emailToStudent:
+                break
+            c._ensureLoaded()
         return self.emailToStudent[email]
 
     # ------------------------------------------------------------------
@@ -249,10 +393,11 @@ class RosterInfo:
             self.fullNameToStudent[fullName] = s
             self.emailToStudent[email] = s
             # support looking up by last name for last names that do not duplicate
-            if lastName not in self.lastNameToStudent:
+            self.lastNameToStudents.setdefault(lastName, []).append(s)
+            if len(self.lastNameToStudents[lastName]) == 1:
                 self.lastNameToStudent[lastName] = s
             else:
-                del self.lastNameToStudent[lastName]
+                self.lastNameToStudent.pop(lastName, None)
 
         s.addCourse(course)
         return s
@@ -264,44 +409,164 @@ class RosterInfo:
 
     # ------------------------------------------------------------------
 
-    def readRosters(self, courseAndFilenames: tuple):
+    @staticmethod
+    def readRosterRows(filename: str) -> List[Tuple[str, str, str]]:
+        """
+        :param filename: path to a roster csv file
+        :return: list of (firstName, lastName, email) for each student in the file
+        """
+        rows = []
+        lineCount = 0
+        headerDict = {}
+        with open(filename) as csvFile:
+            csvReader = csv.reader(csvFile, delimiter=',')
+            for row in csvReader:
+                if lineCount == 0:
+                    for index, value in enumerate(row):
+                        headerDict[value] = index
+                    for field in ("firstName", "first", "First"):
+                        try:
+                            firstNameIndex = headerDict[field]
+                        except:
+                            pass
+                    for field in ("lastName", "last", "Last"):
+                        try:
+                            lastNameIndex = headerDict[field]
+                        except:
+                            pass
+                    for field in ("primaryEmail", "Email", "email1"):
+                        try:
+                            emailIndex = headerDict[field]
+                        except:
+                            pass
+                else:
+                    if len(row) > 0:
+                        rows.append((row[firstNameIndex], row[lastNameIndex], row[emailIndex]))
+
+                lineCount += 1
+        return rows
+
+    # ------------------------------------------------------------------
+
+    def _loadCourse(self, courseObject: Course):
+        """
+        reads the students for the course from the roster cache if the roster file has not changed
+        or from the roster file and adds them to the course and the indexes for all courses
+        """
+        course = courseObject.name()
+        cache = self._cache
+        if self._database is not None:
+            rows = self._database.courseRows(self._semester, course)
+            changed = False
+        elif cache["path"] is not None and cache["cachedSignatures"].get(course) == cache["signatures"][course]:
+            rows = cache["rows"][course]
+            changed = False
+        else:
+            rows = RosterInfo.readRosterRows(courseObject.filename())
+            changed = True
+
+        for firstName, lastName, email in rows:
+            s = self._addOrUpdateStudent(firstName, lastName, email, course)
+            courseObject.addStudent(s)
+            self._bySubmissionKey.setdefault(s.submissionKey(), []).append((s, courseObject))
+
+        if cache["path"] is not None:
+            cache["rows"][course] = rows
+            cache["cachedSignatures"][course] = cache["signatures"][course]
+            if cache["lazy"]:
+                # when some rosters have not been read yet, only write the rows of the roster that changed;
+                # once all are read, write everything so the next run can use it without reading any rosters
+                allLoaded = all(c.isLoaded() for c in self._courses)
+                if changed or allLoaded:
+                    self._writeCache(allLoaded)
+
+    # ------------------------------------------------------------------
+
+    def readRosters(self, courseAndFilenames: tuple, cachePath: Optional[str] = None, lazy: bool = False):
+        """
+        :param courseAndFilenames: ((courseName, pathToRosterFile), (courseName, pathToRosterFile), ...)
+        :param cachePath: if not None, path of a cache of the rosters that is used if the roster files have not changed
+        and that is updated if they have
+        :param lazy: if True, only read a roster the first time its course is used (courseWithName, mergedCourse,
+        findStudentByEmail, Course.students(), etc.)
+        """
         self._courseAndFilenames = courseAndFilenames
+        if cachePath is not None and self._readCache(courseAndFilenames, cachePath, lazy):
+            return
+
         for course, filename in courseAndFilenames:
             courseObject = Course(course, filename)
             self._courses.append(courseObject)
-            csvReader = csv.reader(filename, delimiter=',')
-            lineCount = 0
-            headerDict = {}
-            with open(filename) as csvFile:
-                csvReader = csv.reader(csvFile, delimiter=',')
-                for row in csvReader:
-                    if lineCount == 0:
-                        for index, value in enumerate(row):
-                            headerDict[value] = index
-                        for field in ("firstName", "first", "First"):
-                            try:
-                                firstNameIndex = headerDict[field]
-                            except:
-                                pass
-                        for field in ("lastName", "last", "Last"):
-                            try:
-                                lastNameIndex = headerDict[field]
-                            except:
-                                pass
-                        for field in ("primaryEmail", "Email", "email1"):
-                            try:
-                                emailIndex = headerDict[field]
-                            except:
-                                pass
-                    else:
-                        if len(row) > 0:
-                            firstName = row[firstNameIndex]
-                            lastName = row[lastNameIndex]
-                            email = row[emailIndex]
-                            s = self._addOrUpdateStudent(firstName, lastName, email, course)
-                            courseObject.addStudent(s)
-
-                    lineCount += 1
+            courseObject._loader = self._loadCourse
+        if not lazy:
+            self.loadAllCourses()
+            if cachePath is not None:
+                self._writeCache(True)
+
+    # ------------------------------------------------------------------
+
+    def readRostersFromDatabase(self, database: RosterDatabase, semester: str):
+        """
+        uses the courses for the semester in the database; each course's students are read from the database
+        the first time the course is used and findStudentByEmail and findStudentByName use the database's indexes
+        so they only read the courses the student is in (determineCourse does not read any)
+        :param database: database the rosters were imported into with RosterDatabase.importRosters
+        :param semester: semester such as Fall2022
+        """
+        self._database = database
+        self._semester = semester
+        self.readRosters(tuple(database.courses(semester)), lazy=True)
+
+    # ------------------------------------------------------------------
+
+    def _readCache(self, courseAndFilenames: tuple, cachePath: str, lazy: bool) -> bool:
+        """
+        the cache holds the rows of each roster file (with the mtime and size of the file when it was read)
+        and, if all the rosters were read, this object so nothing needs rebuilt when no roster file changed
+        :return: True if this object was restored from the cache
+        """
+        signatures = {}
+        for course, filename in courseAndFilenames:
+            stat = os.stat(filename)
+            signatures[course] = (filename, stat.st_mtime_ns, stat.st_size)
+
+        try:
+            with open(cachePath, "rb") as infile:
+                cached = pickle.load(infile)
+        except Exception:
+            cached = {}
+        if cached.get("version") != _rosterCacheVersion:
+            cached = {"signatures": {}, "rows": {}}
+
+        if (cached.get("rosterInfo") is not None and cached.get("courseAndFilenames") == tuple(courseAndFilenames)
+                and cached["signatures"] == signatures):
+            self.__dict__.update(cached["rosterInfo"])
+            self._cache = {"path": None}
+            return True
+
+        self._cache = {"path": cachePath, "lazy": lazy, "signatures": signatures,
+                       "cachedSignatures": cached["signatures"], "rows": cached["rows"]}
+        return False
+
+    # ------------------------------------------------------------------
+
+    def _writeCache(self, includeRosterInfo: bool):
+        cache = self._cache
+        rosterInfo = None
+        if includeRosterInfo:
+            rosterInfo = {key: value for key, value in self.__dict__.items() if key != "_cache"}
+        # only keep the courses still in courseAndFilenames so a removed course does not prevent using rosterInfo
+        courses = set(course for course, filename in self._courseAndFilenames)
+        cached = {"version": _rosterCacheVersion, "courseAndFilenames": tuple(self._courseAndFilenames),
+                  "signatures": {course: signature for course, signature in cache["cachedSignatures"].items()
+                                 if course in courses},
+                  "rows": {course: rows for course, rows in cache["rows"].items() if course in courses},
+                  "rosterInfo": rosterInfo}
+        cachePath = cache["path"]
+        try:
+            writeFileAtomically(cachePath, lambda outfile: pickle.dump(cached, outfile, pickle.HIGHEST_PROTOCOL), True)
+        except OSError as e:
+            print(f"unable to write roster cache {cachePath}: {e}")
 
     # ------------------------------------------------------------------
 
@@ -312,59 +577,75 @@ class RosterInfo:
         :param zipPath: path to the zip file
         :return: courseName if found or None if couldn't determine
         """
+        # one pass over the zip's central directory to get the lastfirst user at the start of each filename
         with zipfile.ZipFile(zipPath, "r") as infile:
-            infoList: List[zipfile.ZipInfo] = infile.infolist()
-            filenames = [FileUtils.FileInfo(info.filename).fileName() for info in infoList]
-            # get filenames that are not empty and don't start with a period
-            filenames = [s for s in filenames if s != "" and s[0] != "."]
-            # get everything up to first underscore which should be lastfirst for the person
-            users = set([s.split("_")[0] for s in filenames])
-            courseDict = {}
-            for c in self._courses:
-                courseDict[c.name()] = set()
-                for user in users:
-                    student: Optional[Student] = c.studentMatchingLastNameFirstName(user)
-                    if student is not None:
-                        courseDict[c.name()].add(student)
-
-            nonZero = []
-            for courseName in courseDict:
-                if len(courseDict[courseName]) > 0:
-                    nonZero.append(courseName)
-
-            mergedCourses = dict()
-            if len(nonZero) == 1:
-                return nonZero[0]
-            else:
-                result = set()
-                for name in nonZero:
-                    # remove section and add to set
-                    prefix = name.split("-")[0]
-                    if prefix in result:
-                        mergedCourses[prefix].update(courseDict[name])
-                    else:
-                        mergedCourses[prefix] = courseDict[name].copy()
-                    result.add(prefix)
-
-                if len(result) == 1:
-                    return result.pop()
-
-            # try to match the course with the higher count
-            # a better approach would be to match the course with a higher percentage
-            # of submissions
-            maxCount = 0
-            maxCourse = None
-            for course in mergedCourses:
-                if len(mergedCourses[course]) > maxCount:
-                    maxCourse = course
-                    maxCount = len(mergedCourses[course])
-            if maxCount > 0:
-                return maxCourse
+            names = infile.namelist()
+        users = set()
+        for name in names:
+            # zip files always use / as the separator
+            filename = name.rsplit("/", 1)[-1]
+            # skip directories and files that start with a period
+            if filename != "" and filename[0] != ".":
+                users.add(filename.split("_")[0].lower())
+
+        # names of the sections with the emails of the students in them that submitted
+        submitted: Dict[str, Set[str]] = {}
+        for user in users:
+            # like Course.studentMatchingLastNameFirstName only the longest matching key is used
+            # (smithjohn is not also Jo Smith) and it must be one student
+            matches = self._submissionKeyMatches(user)
+            if len(set(email for email, course in matches)) == 1:
+                for email, course in matches:
+                    submitted.setdefault(course, set()).add(email)
+
+        if len(submitted) == 0:
             return None
+        elif len(submitted) == 1:
+            return next(iter(submitted))
+
+        # combine the sections of each course (remove section from the name)
+        mergedSubmitted: Dict[str, Set[str]] = {}
+        sections: Dict[str, List[str]] = {}
+        for course, emails in submitted.items():
+            prefix = course.split("-")[0]
+            mergedSubmitted.setdefault(prefix, set()).update(emails)
+            sections.setdefault(prefix, []).append(course)
+        studentCounts = {prefix: self._studentCount(names) for prefix, names in sections.items()}
+
+        # the course matching the most submitters wins so a small course whose students are all also in the real
+        # course (such as the CS481 seminar) does not; the fraction of each course's students submitting only
+        # chooses among courses that match nearly as many submitters (a large course with a few of the students)
+        mostSubmitted = max(len(students) for students in mergedSubmitted.values())
+        closest = [prefix for prefix, students in mergedSubmitted.items()
+                   if len(students) >= _nearlyMostSubmitted * mostSubmitted]
+        return max(closest, key=lambda prefix: (len(mergedSubmitted[prefix]) / studentCounts[prefix],
+                                                len(mergedSubmitted[prefix])))
+
+    def _submissionKeyMatches(self, user: str) -> List[Tuple[str, str]]:
+        """
+        :return: list of (email, courseName) for each course of the students whose submission key is the longest
+        prefix of user (using the database's index instead of reading every roster if using a database)
+        """
+        if self._database is not None:
+            return self._database.submissionKeyMatches(user, self._semester)
+        # any course could be the one so all the rosters are needed
+        self.loadAllCourses()
+        keys = prefixKeys(user, self._bySubmissionKey)
+        if len(keys) == 0:
+            return []
+        return [(student.email, course.name()) for student, course in self._bySubmissionKey[keys[0]]]
+
+    def _studentCount(self, courseNames: List[str]) -> int:
+        """
+        :return: number of different students in the courses (such as the sections of a course)
+        """
+        if self._database is not None:
+            return self._database.studentCount(self._semester, courseNames)
+        return len(set(student.email for name in courseNames for student in self.courseWithName(name).students()))
 
     # ------------------------------------------------------------------
 
-    def readRostersFromEnvironmentVariable(self, envVar):
+    def readRostersFromEnvironmentVariable(self, envVar, cachePath: Optional[str] = None, lazy: bool = False):
         try:
             info = os.getenv(envVar)
         except:
@@ -376,7 +657,7 @@ class RosterInfo:
         # turn environment variable that has courseName:pathToRosterFile:courseName:pathToRosterFile
         # into ((courseName, pathToRosterFile), (courseName, pathToRosterFile))
         courseAndFilenames = tuple(zip(*(iter(info),) * 2))
-        self.readRosters(courseAndFilenames)
+        self.readRosters(courseAndFilenames, cachePath, lazy)
 
 # ----------------------------------------------------------------------
 
@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+
+# ----------------------------------------------------------------------
+# Similarity.py
+# Dave Reed
+# 10/17/2026
+# ----------------------------------------------------------------------
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import os
+import os.path
+import pickle
+import random
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from FileUtils import *
+
+# ----------------------------------------------------------------------
+
+# keywords of the languages students use are kept; every other identifier becomes ID so renaming variables does not hide copying
+_keywords = frozenset("""
+and as assert async await break case catch char class const continue def default del delete do double elif else
+enum except extends final finally float for from func global guard if implements import in include int interface
+is lambda let long namespace new nonlocal not nullptr or pass private protected public raise return self short
+signed sizeof static string struct super switch template this throw try typedef typename unsigned using var virtual
+void while with yield True False None true false null nil print cout cin endl std vector map set len range
+""".split())
+
+# comments are matched first so they are skipped, then string literals so a comment marker in a string is not a comment;
+# # only starts a comment in Python (it is #include in C/C++) and // is integer division in Python
+_tokenRest = r"""|(?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+                 |(?P<identifier>[A-Za-z_]\w*)
+                 |(?P<number>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)
+                 |(?P<other>\S)"""
+_tokenPattern = re.compile(r"(?P<comment>//[^\n]*|/\*.*?\*/)" + _tokenRest, re.VERBOSE | re.DOTALL)
+_pythonTokenPattern = re.compile(r"(?P<comment>\#[^\n]*)" + _tokenRest, re.VERBOSE | re.DOTALL)
+
+# Mersenne prime for the MinHash permutations; shingle hashes are less than it so a * x + b fits in 64 bits
+_prime = (1 << 31) - 1
+
+
+def isPythonFile(path: str) -> bool:
+    return FileInfo(path).extension() == ".py"
+
+
+def tokenize(text: str, python: bool = False) -> List[str]:
+    """
+    :param text: contents of a source file
+    :param python: if True, # starts comments; otherwise // and /* */ do (C, C++, Java, Swift, etc.)
+    :return: tokens with comments removed and identifiers, numbers, and strings replaced by ID, NUM, and STR
+    (keywords and operators are kept)
+    """
+    tokens = []
+    for match in (_pythonTokenPattern if python else _tokenPattern).finditer(text):
+        kind = match.lastgroup
+        if kind == "comment":
+            continue
+        elif kind == "identifier":
+            token = match.group()
+            tokens.append(token if token in _keywords else "ID")
+        elif kind == "number":
+            tokens.append("NUM")
+        elif kind == "string":
+            tokens.append("STR")
+        else:
+            tokens.append(match.group())
+    return tokens
+
+
+def shingles(tokens: List[str], shingleSize: int) -> Set[int]:
+    """
+    :param tokens: tokens from tokenize
+    :param shingleSize: number of tokens in each shingle
+    :return: set of hashes (less than _prime) of each run of shingleSize tokens
+    """
+    if len(tokens) == 0:
+        return set()
+    if len(tokens) < shingleSize:
+        # short files are one shingle instead of none
+        shingleSize = len(tokens)
+    # crc32 instead of hash() so the values are the same in every process and can be cached
+    return {zlib.crc32(" ".join(tokens[i:i + shingleSize]).encode()) % _prime
+            for i in range(len(tokens) - shingleSize + 1)}
+
+
+def jaccard(a: Set[int], b: Set[int]) -> float:
+    if len(a) == 0 and len(b) == 0:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+# ----------------------------------------------------------------------
+
+class MinHasher:
+    """
+    computes MinHash signatures of shingle sets; the fraction of positions where two signatures are the same
+    estimates the Jaccard similarity of the sets
+    """
+
+    def __init__(self, numPermutations: int = 128, shingleSize: int = 5, seed: int = 256):
+        """
+        :param numPermutations: number of values in each signature
+        :param shingleSize: number of tokens in each shingle
+        :param seed: seed for the permutations (signatures are only comparable if made with the same seed)
+        """
+        self.numPermutations = numPermutations
+        self.shingleSize = shingleSize
+        self.seed = seed
+        rng = random.Random(seed)
+        self._a = [rng.randrange(1, _prime) for _ in range(numPermutations)]
+        self._b = [rng.randrange(0, _prime) for _ in range(numPermutations)]
+        if numpy is not None:
+            self._aArray = numpy.array(self._a, dtype=numpy.int64)[:, None]
+            self._bArray = numpy.array(self._b, dtype=numpy.int64)[:, None]
+
+    def parameters(self) -> Tuple[int, int, int]:
+        """
+        :return: values that must match for signatures to be compared (part of the signature cache key)
+        """
+        return self.numPermutations, self.shingleSize, self.seed
+
+    def signature(self, shingleSet: Set[int]) -> Tuple[int, ...]:
+        """
+        :param shingleSet: set from shingles
+        :return: minimum of each permutation of the shingles (all _prime for an empty set)
+        """
+        if len(shingleSet) == 0:
+            return (_prime,) * self.numPermutations
+        if numpy is not None:
+            x = numpy.fromiter(shingleSet, dtype=numpy.int64, count=len(shingleSet))[None, :]
+            return tuple(((self._aArray * x + self._bArray) % _prime).min(axis=1).tolist())
+        return tuple(min((a * x + b) % _prime for x in shingleSet) for a, b in zip(self._a, self._b))
+
+    def textShingles(self, text: str, python: bool = False) -> Tuple[frozenset, Tuple[int, ...]]:
+        """
+        :param text: contents of a source file
+        :param python: see tokenize
+        :return: (shingles, signature) of the text
+        """
+        shingleSet = frozenset(shingles(tokenize(text, python), self.shingleSize))
+        return shingleSet, self.signature(shingleSet)
+
+
+def combineSignatures(signatures: Iterable[Tuple[int, ...]], numPermutations: int) -> Tuple[int, ...]:
+    """
+    :return: signature of the union of the shingle sets (the minimum of each position)
+    """
+    result = (_prime,) * numPermutations
+    for signature in signatures:
+        result = tuple(map(min, result, signature))
+    return result
+
+# ----------------------------------------------------------------------
+
+def defaultSignatureCachePath() -> str:
+    """
+    :return: path to use for the cache of the signatures of files that have been compared before
+    """
+    return defaultCachePath("signatures.pickle")
+
+
+class SignatureCache:
+    """
+    (shingles, signature) of files keyed by the SHA-256 of each file's contents, its language, and the MinHasher parameters
+    so the same file in a later week or semester is not tokenized again
+    """
+
+    def __init__(self, cachePath: Optional[str]):
+        """
+        :param cachePath: pickle file to read and write or None to not save the signatures
+        """
+        self._cachePath = cachePath
+        self._signatures = {}
+        self._changed = False
+        if cachePath is not None:
+            try:
+                with open(cachePath, "rb") as infile:
+                    self._signatures = pickle.load(infile)
+            except Exception:
+                self._signatures = {}
+
+    def get(self, key: tuple):
+        return self._signatures.get(key)
+
+    def put(self, key: tuple, value: Tuple[frozenset, Tuple[int, ...]]):
+        self._signatures[key] = value
+        self._changed = True
+
+    def save(self):
+        if self._cachePath is None or not self._changed:
+            return
+        try:
+            writeFileAtomically(self._cachePath,
+                                lambda outfile: pickle.dump(self._signatures, outfile, pickle.HIGHEST_PROTOCOL), True)
+            self._changed = False
+        except OSError as e:
+            print(f"unable to write signature cache {self._cachePath}: {e}")
+
+# ----------------------------------------------------------------------
+
+def contentDigest(contents: str) -> str:
+    return hashlib.sha256(contents.encode()).hexdigest()
+
+
+# set in each worker process by _initWorker so the permutations are only made once per worker
+_hasher: Optional[MinHasher] = None
+
+
+def _initWorker(parameters: Tuple[int, int, int]):
+    global _hasher
+    _hasher = MinHasher(*parameters)
+
+
+def _textShingles(contentsAndPython: Tuple[str, bool]) -> Tuple[frozenset, Tuple[int, ...]]:
+    return _hasher.textShingles(*contentsAndPython)
+
+
+def _signature(shingleSet: Set[int]) -> Tuple[int, ...]:
+    return _hasher.signature(shingleSet)
+
+
+def candidatePairs(signatures: Dict[str, Tuple[int, ...]], bands: int) -> Set[Tuple[str, str]]:
+    """
+    LSH banding: splits each signature into bands and returns the pairs that are the same in at least one band
+    so only those pairs need compared (pairs with Jaccard similarity s are found with probability 1 - (1 - s^r)^bands
+    where r is the number of values in each band)
+    :param signatures: dictionary with the label of each submission as the key and its signature as the value
+    :param bands: number of bands (must evenly divide the length of the signatures)
+    :return: set of (label, label) with the labels in sorted order
+    """
+    pairs = set()
+    for band in range(bands):
+        buckets: Dict[Tuple[int, ...], List[str]] = {}
+        for label, signature in signatures.items():
+            rows = len(signature) // bands
+            bandValues = signature[band * rows:(band + 1) * rows]
+            # submissions with no shingles would all be in the same bucket
+            if bandValues[0] != _prime:
+                buckets.setdefault(bandValues, []).append(label)
+        for labels in buckets.values():
+            labels.sort()
+            for i, first in enumerate(labels):
+                for second in labels[i + 1:]:
+                    pairs.add((first, second))
+    return pairs
+
+
+def commonShingles(shingleSets: Iterable[Set[int]], fraction: float, minimumCount: int = 5) -> Set[int]:
+    """
+    :param shingleSets: shingles of each submission
+    :param fraction: shingles in more than this fraction of the submissions are common (such as starter code)
+    :param minimumCount: shingles must also be in more than this many submissions so a few copies are never common
+    :return: the common shingles
+    """
+    counts: Dict[int, int] = {}
+    total = 0
+    for shingleSet in shingleSets:
+        total += 1
+        for shingle in shingleSet:
+            counts[shingle] = counts.get(shingle, 0) + 1
+    limit = max(fraction * total, minimumCount)
+    return {shingle for shingle, count in counts.items() if count > limit}
+
+
+def findSimilar(submissions: Dict[str, List[str]], hasher: MinHasher, cache: SignatureCache, bands: int = 32,
+                threshold: float = 0.5, jobs: int = 1, samePair=None, ignore: Optional[Set[int]] = None,
+                commonFraction: Optional[float] = 0.5) -> Tuple[List[Tuple[float, str, str]], int]:
+    """
+    finds submissions whose shingles have a Jaccard similarity of at least threshold without comparing every pair:
+    the shingles and MinHash signature of each file are computed (or read from the cache), shingles that are
+    in starter code or in most of the submissions are removed, and LSH banding of each submission's signature
+    picks the candidate pairs whose exact Jaccard similarity is then computed
+    :param submissions: dictionary with a label for each submission (such as Grade/<email>) as the key
+    and the paths of its files as the value
+    :param hasher: MinHasher to make the signatures with
+    :param cache: cache of shingles and signatures of files that have been seen before
+    :param bands: number of LSH bands (more bands find less similar pairs but give more candidates)
+    :param threshold: minimum Jaccard similarity to report
+    :param jobs: number of processes to use to compute shingles and signatures
+    :param samePair: if not None, function of two labels that returns True if the pair should be skipped
+    :param ignore: if not None, shingles to remove from every submission (such as from baseShingles)
+    :param commonFraction: if not None, remove shingles in more than this fraction of the submissions (see commonShingles)
+    :return: (list of (similarity, label, label) sorted with the most similar first, number of candidate pairs)
+    """
+    contents = {path: FileInfo(path).contentsOf() or "" for paths in submissions.values() for path in paths}
+    pythonFiles = {path: isPythonFile(path) for path in contents}
+    keys = {path: hasher.parameters() + (pythonFiles[path], contentDigest(text)) for path, text in contents.items()}
+
+    # only compute each different file once (such as starter code every student has)
+    missing = {}
+    for path, key in keys.items():
+        if cache.get(key) is None and key not in missing:
+            missing[key] = (contents[path], pythonFiles[path])
+
+    with ProcessPoolExecutor(max_workers=max(1, jobs), initializer=_initWorker,
+                             initargs=(hasher.parameters(),)) as executor:
+        useProcesses = jobs > 1
+        if len(missing) > 0:
+            if useProcesses and len(missing) > 1:
+                results = list(executor.map(_textShingles, missing.values(), chunksize=16))
+            else:
+                results = [hasher.textShingles(*value) for value in missing.values()]
+            for key, result in zip(missing, results):
+                cache.put(key, result)
+
+        shingleSets = {label: frozenset().union(*(cache.get(keys[path])[0] for path in paths))
+                       for label, paths in submissions.items()}
+        removed = set(ignore) if ignore is not None else set()
+        if commonFraction is not None:
+            removed |= commonShingles(shingleSets.values(), commonFraction)
+
+        # the cached signatures of the files can be combined if none of their shingles were removed;
+        # otherwise the signature of what is left is computed
+        signatures = {}
+        recompute = {}
+        for label, shingleSet in shingleSets.items():
+            if removed.isdisjoint(shingleSet):
+                signatures[label] = combineSignatures((cache.get(keys[path])[1] for path in submissions[label]),
+                                                      hasher.numPermutations)
+            else:
+                shingleSets[label] = shingleSet - removed
+                recompute[label] = shingleSets[label]
+        if useProcesses and len(recompute) > 1:
+            results = list(executor.map(_signature, recompute.values(), chunksize=16))
+        else:
+            results = [hasher.signature(shingleSet) for shingleSet in recompute.values()]
+        signatures.update(zip(recompute, results))
+
+    pairs = candidatePairs(signatures, bands)
+
+    similar = []
+    for first, second in pairs:
+        if samePair is not None and samePair(first, second):
+            continue
+        similarity = jaccard(shingleSets[first], shingleSets[second])
+        if similarity >= threshold:
+            similar.append((similarity, first, second))
+    similar.sort(key=lambda result: (-result[0], result[1], result[2]))
+    return similar, len(pairs)
+
+
+def baseShingles(baseDir: str, hasher: MinHasher, extensions: Optional[List[str]] = None) -> Set[int]:
+    """
+    :param baseDir: directory with the starter code given to every student
+    :return: shingles of every file in the directory and its subdirectories
+    """
+    result = set()
+    for path in DirectoryInfo(baseDir, recursive=True).allFiles():
+        if FileInfo(path).extension() in extensions if extensions is not None else isSourceFile(path):
+            result.update(shingles(tokenize(FileInfo(path).contentsOf() or "", isPythonFile(path)), hasher.shingleSize))
+    return result
+
+# ----------------------------------------------------------------------
+
+# made by running the code (such as with run_dir.py) rather than by the student
+_generatedDirectories = frozenset(("__pycache__",))
+
+
+def isSourceFile(path: str) -> bool:
+    """
+    :return: False if the file is in a generated directory such as __pycache__ or is not text
+    (has a 0 byte near the start such as .pyc files and executables)
+    """
+    if any(part in _generatedDirectories for part in path.split(os.sep)):
+        return False
+    try:
+        with open(path, "rb") as infile:
+            return b"\0" not in infile.read(8192)
+    except OSError:
+        return False
+
+
+def submissionFiles(gradeDirs: List[str], extensions: Optional[List[str]] = None) -> Dict[str, List[str]]:
+    """
+    :param gradeDirs: directories containing a directory for each student such as Grade or ~/Labs/CS160/Grade
+    :param extensions: if not None, only use files with these extensions (such as .py);
+    otherwise use every file for which isSourceFile is True
+    :return: dictionary with gradeDir/<email> as the key and the paths of the files in it as the value
+    """
+    submissions = {}
+    for gradeDir in gradeDirs:
+        for studentPath in sorted(DirectoryInfo(gradeDir).directories()):
+            paths = sorted(DirectoryInfo(studentPath, recursive=True).allFiles())
+            if extensions is not None:
+                paths = [path for path in paths if FileInfo(path).extension() in extensions]
+            else:
+                paths = [path for path in paths if isSourceFile(path)]
+            if len(paths) > 0:
+                submissions[os.path.join(gradeDir, FileInfo(studentPath).fileName())] = paths
+    return submissions
+
+
+def main():
+    parser = ArgumentParser(description='''find student directories with similar code in one or more Grade directories
+    (such as this week and earlier weeks or semesters) using MinHash signatures and LSH so not every pair is compared''')
+    parser.add_argument("-t", "--threshold", dest="threshold", type=float, default=0.5,
+                        help='minimum Jaccard similarity of the shingles to report')
+    parser.add_argument("-k", "--shingle", dest="shingleSize", type=int, default=5, help='number of tokens in each shingle')
+    parser.add_argument("-n", "--permutations", dest="numPermutations", type=int, default=128,
+                        help='number of values in each MinHash signature')
+    parser.add_argument("-b", "--bands", dest="bands", type=int, default=32,
+                        help='number of LSH bands (must divide the number of permutations); more bands finds less similar pairs')
+    parser.add_argument("-e", "--extension", dest="extensions", action='append', default=None,
+                        help='only compare files with this extension such as .py (can be repeated)')
+    parser.add_argument("--base", dest="baseDir", default=None,
+                        help='directory with the starter code; code that is also in it is not counted as similar')
+    parser.add_argument("--common", dest="commonFraction", type=float, default=0.5,
+                        help='ignore code in more than this fraction of the submissions (such as starter code); 1 to keep everything')
+    parser.add_argument("-j", "--jobs", dest="jobs", type=int, default=os.cpu_count(), help='number of processes to use')
+    parser.add_argument("--cache", dest="cachePath", default=defaultSignatureCachePath(), help='signature cache file')
+    parser.add_argument("--no-cache", dest="useCache", action='store_false', help='do not read or write the signature cache')
+    parser.add_argument("--same-student", dest="sameStudent", action='store_true',
+                        help='also report a student directory that is similar to the same student\'s directory in another Grade directory')
+    parser.add_argument("--json", dest="jsonFile", default=None, help='also write the results to this JSON file')
+    parser.add_argument("gradeDirs", nargs='*', default=["Grade"], help='directories containing a directory for each student')
+    options = parser.parse_args()
+
+    if options.bands <= 0 or options.numPermutations % options.bands != 0:
+        print(f"number of bands {options.bands} must divide the number of permutations {options.numPermutations}")
+        return
+    for gradeDir in options.gradeDirs + ([options.baseDir] if options.baseDir is not None else []):
+        if not os.path.isdir(gradeDir):
+            print(f"{gradeDir} does not exist")
+            return
+
+    submissions = submissionFiles(options.gradeDirs, options.extensions)
+    hasher = MinHasher(options.numPermutations, options.shingleSize)
+    cache = SignatureCache(options.cachePath if options.useCache else None)
+
+    samePair = None
+    if not options.sameStudent:
+        samePair = lambda first, second: os.path.basename(first) == os.path.basename(second)
+    ignore = baseShingles(options.baseDir, hasher, options.extensions) if options.baseDir is not None else None
+    commonFraction = options.commonFraction if options.commonFraction < 1 else None
+    similar, candidateCount = findSimilar(submissions, hasher, cache, options.bands, options.threshold,
+                                          options.jobs, samePair, ignore, commonFraction)
+    cache.save()
+
+    for similarity, first, second in similar:
+        print(f"{similarity:.2f} {first} {second}")
+    print(f"{len(submissions)} submissions, {candidateCount} candidate pairs, {len(similar)} similar pairs")
+
+    if options.jsonFile is not None:
+        with open(options.jsonFile, 'w') as outfile:
+            json.dump({"threshold": options.threshold, "submissions": len(submissions), "candidatePairs": candidateCount,
+                       "similar": [{"similarity": similarity, "first": first, "second": second}
+                                   for similarity, first, second in similar]}, outfile, indent=2)
+
+# ----------------------------------------------------------------------
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+
+# ----------------------------------------------------------------------
+# benchmark.py
+# Dave Reed
+# 10/17/2026
+# ----------------------------------------------------------------------
+
+from argparse import ArgumentParser
+import contextlib
+import csv
+import inspect
+import io
+import json
+import os
+import os.path
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from typing import Callable, List, Optional, Tuple
+
+# only APIs every revision has are imported so the same benchmarks can run on older revisions to compare them;
+# benchmarks of newer APIs are skipped when they are missing (see benchmarks)
+import FileUtils
+from FileUtils import FileInfo
+from RosterInfo import RosterInfo
+from myDiff import stripAndRemoveEmptyLines
+import mycap
+import submissions
+
+# ----------------------------------------------------------------------
+
+# names used to make students; the last names are a small list so there are many students with the same last name
+firstNames = ["James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda", "William", "Elizabeth",
+              "David", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen",
+              "Christopher", "Nancy", "Daniel", "Lisa", "Matthew", "Betty", "Anthony", "Margaret", "Mark", "Sandra",
+              "Jo", "Ann", "Al", "Li", "Ed", "Kim"]
+lastNames = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+             "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+             "Lee", "Perez", "Thompson", "White", "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson",
+             "Smith-Jones", "Reed", "Reeder", "Li", "Lin"]
+middleNames = ["", "", "", "Q", "Marie", "Lee", "Ann Marie"]
+classLevels = ["Freshman", "Sophomore", "Junior", "Senior", "Senior, 2nd Degree"]
+extensions = [".py", ".cpp", ".h", ".java", ".txt"]
+
+# (number of students, number of files each student submits) used if --scale is not given
+defaultScales = [(30, 1), (300, 5), (2000, 10)]
+
+# students in each section; sections are CS160-1, CS160-2, ... and a second course CS250-1, ... with the same size
+sectionSize = 30
+
+# ----------------------------------------------------------------------
+
+class SyntheticStudent:
+
+    def __init__(self, firstName: str, middleName: str, lastName: str, suffix: str, email: str, identifier: int):
+        self.firstName = firstName
+        self.middleName = middleName
+        self.lastName = lastName
+        self.suffix = suffix
+        self.email = email
+        self.identifier = identifier
+
+    def myCapName(self) -> str:
+        """
+        :return: Student Name as myCap has it such as "John Q Smith Jr"
+        """
+        return " ".join(field for field in (self.firstName, self.middleName, self.lastName, self.suffix) if field != "")
+
+    def submissionKey(self) -> str:
+        """
+        :return: lastfirst that Canvas starts submission filenames with
+        """
+        return f"{self.lastName.replace('-', '')}{self.firstName}".lower()
+
+
+def makeStudents(count: int, rng: random.Random) -> List[SyntheticStudent]:
+    """
+    :param count: number of students
+    :param rng: random number generator so the same seed makes the same students
+    :return: students with unique emails and unique lastfirst keys but many shared last names
+    """
+    students = []
+    keys = set()
+    while len(students) < count:
+        firstName = rng.choice(firstNames)
+        lastName = rng.choice(lastNames)
+        # keep lastfirst unique so every submission has one student; letters make the names realistic
+        # and also make some keys prefixes of others (smithjo and smithjoa)
+        n = 0
+        candidate = firstName
+        while f"{lastName.replace('-', '')}{candidate}".lower() in keys:
+            n += 1
+            candidate = firstName + "abcdefghijklmnopqrstuvwxyz"[n % 26] * (1 + n // 26)
+        firstName = candidate
+        suffix = "Jr" if rng.random() < 0.03 else ""
+        identifier = 900000 + len(students)
+        email = f"{firstName[0]}{lastName.replace('-', '')}{identifier}@example.edu".lower()
+        student = SyntheticStudent(firstName, rng.choice(middleNames), lastName, suffix, email, identifier)
+        keys.add(student.submissionKey())
+        students.append(student)
+    return students
+
+# ----------------------------------------------------------------------
+
+def writeMyCapRoster(path: str, students: List[SyntheticStudent], rng: random.Random):
+    """
+    writes a roster in the format downloaded from myCap
+    """
+    with open(path, 'w', newline='') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(["Student Name", "Preferred Email", "Student ID", "Class Level"])
+        for student in students:
+            writer.writerow([student.myCapName(), student.email, student.identifier, rng.choice(classLevels)])
+
+
+def writeRoster(path: str, students: List[SyntheticStudent]):
+    """
+    writes a roster.csv the way mycap.py converts a myCap roster (suffixes dropped and hyphens removed from the last name)
+    """
+    with open(path, 'w', newline='') as outfile:
+        writer = csv.writer(outfile, lineterminator='\n')
+        writer.writerow(["lastName", "firstName", "middleName", "primaryEmail", "identifier", "note"])
+        for student in students:
+            writer.writerow([student.lastName.replace('-', ''), student.firstName, student.middleName, student.email,
+                             student.identifier, ""])
+
+
+def sourceLines(rng: random.Random, count: int) -> List[str]:
+    """
+    :return: lines that look like a small program with indentation, trailing spaces and blank lines
+    """
+    lines = []
+    for i in range(count):
+        r = rng.random()
+        if r < 0.15:
+            lines.append("")
+        elif r < 0.2:
+            lines.append("   ")
+        else:
+            indent = "    " * rng.randrange(3)
+            lines.append(f"{indent}value{i} = compute(value{i - 1}, {rng.randrange(1000)})  ")
+    return lines
+
+
+def writeSubmissionsZip(path: str, students: List[SyntheticStudent], filesPerStudent: int, rng: random.Random,
+                        submitFraction: float = 0.9, lateFraction: float = 0.1, resubmitFraction: float = 0.1,
+                        linesPerFile: int = 40) -> List[str]:
+    """
+    writes a zip file like Canvas creates with files named lastfirst_id_id_name.ext
+    (lastfirst_LATE_id_id_name.ext if late and name-1.ext for a resubmission)
+    :return: names of the files in the zip file
+    """
+    names = []
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as outfile:
+        for student in students:
+            if rng.random() >= submitFraction:
+                continue
+            late = "_LATE" if rng.random() < lateFraction else ""
+            submissionId = rng.randrange(10 ** 7, 10 ** 8)
+            for k in range(filesPerStudent):
+                resubmit = f"-{rng.randrange(1, 4)}" if rng.random() < resubmitFraction else ""
+                filename = f"file{k}{resubmit}{rng.choice(extensions)}"
+                name = f"{student.submissionKey()}{late}_{student.identifier}_{submissionId}_{filename}"
+                outfile.writestr(name, "\n".join(sourceLines(rng, linesPerFile)) + "\n")
+                names.append(name)
+    return names
+
+# ----------------------------------------------------------------------
+
+class Scenario:
+    """
+    synthetic rosters and a submissions.zip for one scale in a temporary directory used as HOME
+    so submissions.py reads and writes ~/Downloads and ~/Labs there
+    """
+
+    def __init__(self, students: int, filesPerStudent: int, seed: int):
+        self.students = students
+        self.filesPerStudent = filesPerStudent
+        rng = random.Random(seed)
+
+        self._tempDir = tempfile.TemporaryDirectory(prefix="benchmark")
+        self.home = self._tempDir.name
+        semesterDir = os.path.join(self.home, "Private", "Grades", "Fall2026")
+        os.makedirs(os.path.join(self.home, "Downloads"))
+
+        # the course being graded plus a second course of the same size so determineCourse has to choose
+        allStudents = makeStudents(2 * students, rng)
+        self.courseStudents = allStudents[:students]
+        courseAndFilenames = []
+        self.myCapPaths = []
+        for courseNumber, courseStudents in (("CS160", allStudents[:students]), ("CS250", allStudents[students:])):
+            for section, start in enumerate(range(0, len(courseStudents), sectionSize)):
+                name = f"{courseNumber}-{section + 1}"
+                courseDir = os.path.join(semesterDir, name)
+                os.makedirs(courseDir)
+                myCapPath = os.path.join(self.home, "Downloads", f"section-rosters-{name}.csv")
+                writeMyCapRoster(myCapPath, courseStudents[start:start + sectionSize], rng)
+                self.myCapPaths.append(myCapPath)
+                writeRoster(os.path.join(courseDir, "roster.csv"), courseStudents[start:start + sectionSize])
+                courseAndFilenames.append((name, os.path.join(courseDir, "roster.csv")))
+        self.courseAndFilenames = tuple(courseAndFilenames)
+        self.cachePath = os.path.join(self.home, ".cache", "rosters.pickle")
+
+        self.zipPath = os.path.join(self.home, "Downloads", "submissions.zip")
+        self.zipNames = writeSubmissionsZip(self.zipPath, self.courseStudents, filesPerStudent, rng)
+
+        self.rosterInfo = RosterInfo()
+        self.rosterInfo.readRosters(self.courseAndFilenames)
+        self.course = self.rosterInfo.mergedCourse("CS160")
+
+    def cleanup(self):
+        self._tempDir.cleanup()
+
+    def extractSubmissions(self):
+        """
+        extracts submissions.zip to ~/Downloads/submissions the way checkZip does before matchFiles
+        """
+        submissionsPath = os.path.join(self.home, "Downloads", "submissions")
+        shutil.rmtree(submissionsPath, True)
+        with zipfile.ZipFile(self.zipPath) as infile:
+            infile.extractall(submissionsPath)
+
+    def gradedFiles(self) -> List[str]:
+        """
+        :return: paths of the files in ~/Labs/CS160/Grade (after matchFiles)
+        """
+        gradePath = os.path.join(self.home, "Labs", "CS160", "Grade")
+        return [os.path.join(root, name) for root, dirs, files in os.walk(gradePath) for name in files]
+
+# ----------------------------------------------------------------------
+
+def benchmarks(scenario: Scenario) -> List[Tuple[str, Optional[Callable], Callable]]:
+    """
+    :return: list of (name, setup, run); setup (not timed) returns the arguments for run
+    """
+
+    def readRosters():
+        RosterInfo().readRosters(scenario.courseAndFilenames)
+
+    def setupConvertRoster():
+        convertedDir = os.path.join(scenario.home, "converted")
+        os.makedirs(convertedDir, exist_ok=True)
+        return ([(path, os.path.join(convertedDir, f"roster{i}.csv"), os.path.join(convertedDir, f"ga{i}.csv"))
+                 for i, path in enumerate(scenario.myCapPaths)],)
+
+    def convertRoster(paths):
+        for myCapPath, rosterPath, gaPath in paths:
+            mycap.convertRoster(myCapPath, rosterPath, gaPath)
+
+    def setupCachedRosters():
+        # make sure the cache exists so only reading it is timed
+        if not os.path.exists(scenario.cachePath):
+            RosterInfo().readRosters(scenario.courseAndFilenames, scenario.cachePath)
+        return ()
+
+    def readCachedRosters():
+        RosterInfo().readRosters(scenario.courseAndFilenames, scenario.cachePath)
+
+    def setupSubmissionFiles():
+        # matchFiles and extractToGrade remove _LATE_ before matching
+        return ([name.replace("_LATE_", "_") for name in scenario.zipNames],)
+
+    def findStudentBySubmissionFile(names):
+        for name in names:
+            scenario.course.findStudentBySubmissionFile(name)
+
+    def determineCourse():
+        scenario.rosterInfo.determineCourse(scenario.zipPath)
+
+    def setupMatchFiles():
+        scenario.extractSubmissions()
+        return ()
+
+    def matchFiles():
+        submissions.matchFiles(scenario.course)
+
+    def setupLines():
+        lines = []
+        for path in scenario.gradedFiles():
+            with open(path) as infile:
+                lines.extend(infile.read().split("\n"))
+        return (lines,)
+
+    def stripLines(lines):
+        # copy since stripAndRemoveEmptyLines changes the list
+        stripAndRemoveEmptyLines(list(lines), True, True, True)
+
+    hasContentCache = hasattr(FileUtils, "contentCache")
+
+    def setupColdContents():
+        if hasContentCache:
+            FileUtils.contentCache.clear()
+        return (scenario.gradedFiles(),)
+
+    def setupWarmContents():
+        paths = scenario.gradedFiles()
+        for path in paths:
+            FileInfo(path).contentsOf()
+        return (paths,)
+
+    def contentsOf(paths):
+        for path in paths:
+            FileInfo(path).contentsOf()
+
+    # matchFiles is before the benchmarks that use the files it puts in the Grade directory
+    result = []
+    # older revisions only convert in mycap.main
+    if hasattr(mycap, "convertRoster"):
+        result.append(("convertRoster", setupConvertRoster, convertRoster))
+    result.append(("readRosters", None, readRosters))
+    if "cachePath" in inspect.signature(RosterInfo.readRosters).parameters:
+        result.append(("readRosters (cached)", setupCachedRosters, readCachedRosters))
+    result += [("findStudentBySubmissionFile", setupSubmissionFiles, findStudentBySubmissionFile),
+               ("determineCourse", None, determineCourse),
+               ("matchFiles", setupMatchFiles, matchFiles),
+               ("stripAndRemoveEmptyLines", setupLines, stripLines),
+               ("contentsOf (cold)", setupColdContents, contentsOf)]
+    # without contentCache every FileInfo reads the file again so there is no warm case
+    if hasContentCache:
+        result.append(("contentsOf (warm)", setupWarmContents, contentsOf))
+    return result
+
+
+def measure(setup: Optional[Callable], run: Callable, repeat: int) -> dict:
+    """
+    runs setup and then run repeat times timing each run, then once more with tracemalloc for the peak memory
+    (separately since tracemalloc slows down the code it traces)
+    :return: dictionary with seconds (fastest), times, and peakBytes
+    """
+    times = []
+    for i in range(repeat + 1):
+        args = setup() if setup is not None else ()
+        if i == repeat:
+            tracemalloc.start()
+            run(*args)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            start = time.perf_counter()
+            run(*args)
+            times.append(time.perf_counter() - start)
+    return {"seconds": min(times), "times": times, "peakBytes": peak}
+
+
+def runBenchmarks(scales: List[Tuple[int, int]], repeat: int, seed: int, only: Optional[List[str]] = None) -> List[dict]:
+    """
+    :param scales: list of (number of students, files per student)
+    :param repeat: number of times to time each benchmark
+    :param seed: seed for generating the data so each revision is measured with the same data
+    :param only: if not None, names of the benchmarks to run
+    :return: list of results with students, filesPerStudent, files, benchmark, seconds, times, and peakBytes
+    """
+    results = []
+    home = os.getenv("HOME")
+    cwd = os.getcwd()
+    for students, filesPerStudent in scales:
+        scenario = Scenario(students, filesPerStudent, seed)
+        os.environ["HOME"] = scenario.home
+        try:
+            for name, setup, run in benchmarks(scenario):
+                if only is not None and name not in only:
+                    continue
+                # the code being measured prints unmatched files, etc.
+                with contextlib.redirect_stdout(io.StringIO()):
+                    result = measure(setup, run, repeat)
+                result = {"students": students, "filesPerStudent": filesPerStudent, "files": len(scenario.zipNames),
+                          "benchmark": name, **result}
+                print(f'{students:6d} {filesPerStudent:3d} {name:30s} {result["seconds"]:10.4f} s '
+                      f'{result["peakBytes"] / 2 ** 20:10.2f} MB')
+                results.append(result)
+        finally:
+            # matchFiles changes the current directory to the submissions directory
+            os.chdir(cwd)
+            if home is not None:
+                os.environ["HOME"] = home
+            scenario.cleanup()
+    return results
+
+
+def gitRevision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# ----------------------------------------------------------------------
+
+def parseScale(s: str) -> Tuple[int, int]:
+    students, filesPerStudent = s.split(":")
+    return int(students), int(filesPerStudent)
+
+
+def main():
+    parser = ArgumentParser(description='''time the roster and submission code on generated rosters and submissions.zip
+    files and write the times and peak memory to a JSON file to compare revisions; runs entirely in a temporary directory''')
+    parser.add_argument("-s", "--scale", dest="scales", type=parseScale, action='append', default=None,
+                        help='STUDENTS:FILES number of students and files per student (can be repeated; '
+                             f'default {" ".join(f"{s}:{f}" for s, f in defaultScales)}, largest sensible is 20000:50)')
+    parser.add_argument("-r", "--repeat", dest="repeat", type=int, default=3, help='number of times to time each benchmark')
+    parser.add_argument("--seed", dest="seed", type=int, default=256, help='seed for generating the data')
+    parser.add_argument("-b", "--benchmark", dest="only", action='append', default=None,
+                        help='only run this benchmark (can be repeated)')
+    parser.add_argument("-o", "--output", dest="output", default="benchmark.json", help='JSON file for the results')
+    options = parser.parse_args()
+
+    scales = options.scales if options.scales is not None else defaultScales
+    results = runBenchmarks(scales, max(1, options.repeat), options.seed, options.only)
+
+    report = {"revision": gitRevision(), "python": sys.version.split()[0], "platform": platform.platform(),
+              "repeat": options.repeat, "seed": options.seed, "results": results}
+    with open(options.output, 'w') as outfile:
+        json.dump(report, outfile, indent=2)
+    print(f"results written to {options.output}")
+
+# ----------------------------------------------------------------------
+
+if __name__ == '__main__':
+    main()
@@ -7,53 +7,162 @@
 # ----------------------------------------------------------------------
 
 import argparse
+import hashlib
+import itertools
+import math
 import os
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # ----------------------------------------------------------------------
 
-def stripAndRemoveEmptyLines(lines: list, leadingWhiteSpace: bool = False, blankLinesAtBeginning: bool = False, allBlankLines: bool = False):
-    
-    for idx, line in enumerate(lines):
-        if leadingWhiteSpace:
-            line = line.strip()
+def normalizedLines(lines: Iterable[str], leadingWhiteSpace: bool = False, blankLinesAtBeginning: bool = False, allBlankLines: bool = False) -> Iterator[str]:
+    """
+    generator that strips each line and removes blank lines in a single pass without holding all the lines
+    :param lines: lines such as a list or a file opened for reading
+    :param leadingWhiteSpace: if True, strip whitespace at beginning of lines in addition to the end
+    :param blankLinesAtBeginning: if True, remove blank lines at beginning
+    :param allBlankLines: if True, remove all blank lines
+    :return: iterator of the lines (blank lines at the end are always removed)
+    """
+    strip = str.strip if leadingWhiteSpace else str.rstrip
+    # blank lines are only output once a non-blank line follows them so ones at the end are removed
+    blankCount = 0
+    started = not blankLinesAtBeginning
+    for line in lines:
+        line = strip(line)
+        if line == '':
+            if started and not allBlankLines:
+                blankCount += 1
         else:
-            line = line.rstrip()
-            
-        lines[idx] = line
-    
-    # remove blank lines at end
-    while len(lines) > 0 and lines[-1] == '':
-        lines.pop()
-    
-    # if requested, remove blank lines at beginning
-    if blankLinesAtBeginning:
-        while len(lines) > 0 and lines[0] == '':
-            lines.pop(0)
-    
-    # if requested, remove all blank lines
-    if allBlankLines:
-        pos = 0
-        while pos < len(lines):
-            # if line is blank, remove it and leave pos where it is so check next line which is now at same pos
-            if lines[pos] == '':
-                lines.pop(pos)
-            # otherwise move to next line
-            else:
-                pos += 1
+            if blankCount > 0:
+                yield from itertools.repeat('', blankCount)
+                blankCount = 0
+            started = True
+            yield line
+
+# ----------------------------------------------------------------------
+
+def cappedLines(infile, maxLineLength: int) -> Iterator[str]:
+    """
+    generator for the lines of an open file that never holds more than maxLineLength characters of a line
+    (such as output from a program that printed without newlines); the rest of a longer line is replaced by
+    its length and a hash so lines that differ after the first maxLineLength characters are still different
+    :param infile: file opened for reading text
+    :param maxLineLength: maximum number of characters of a line to keep
+    """
+    while True:
+        line = infile.readline(maxLineLength)
+        if line == '':
+            return
+        if len(line) < maxLineLength or line.endswith('\n'):
+            yield line
+            continue
+
+        # hash the rest of the line a chunk at a time leaving out trailing whitespace as normalizedLines does
+        digest = hashlib.sha256()
+        count = 0
+        whitespace = ''
+        while True:
+            chunk = infile.readline(maxLineLength)
+            if chunk == '':
+                break
+            body = chunk.rstrip()
+            if body != '':
+                digest.update((whitespace + body).encode())
+                count += len(whitespace) + len(body)
+                whitespace = ''
+            whitespace += chunk[len(body):]
+            if chunk.endswith('\n'):
+                break
+        if count == 0:
+            yield line
+        else:
+            yield f'{line} ... [{count} more characters, sha256 {digest.hexdigest()[:16]}]'
+
+
+def readNormalizedLines(filename: str, leadingWhiteSpace: bool = False, blankLinesAtBeginning: bool = False, allBlankLines: bool = False,
+                        maxLineLength: Optional[int] = None) -> Iterator[str]:
+    """
+    generator for the lines of the file after normalizedLines removes whitespace and blank lines as specified
+    :param maxLineLength: if not None, keep at most this many characters of each line (see cappedLines)
+    """
+    with open(filename, 'r') as infile:
+        lines = infile if maxLineLength is None else cappedLines(infile, maxLineLength)
+        yield from normalizedLines(lines, leadingWhiteSpace, blankLinesAtBeginning, allBlankLines)
+
+# ----------------------------------------------------------------------
+
+def filesIdentical(file1: str, file2: str, chunkSize: int = 1 << 20) -> bool:
+    """
+    compares the bytes of the files a chunk at a time without reading them into lines
+    (not memory mapped so large files do not add to the memory used)
+    :return: True if the files have exactly the same contents
+    """
+    if os.path.getsize(file1) != os.path.getsize(file2):
+        return False
+    with open(file1, 'rb') as infile1, open(file2, 'rb') as infile2:
+        while True:
+            data1 = infile1.read(chunkSize)
+            if data1 != infile2.read(chunkSize):
+                return False
+            if len(data1) == 0:
+                return True
+
+
+def fileDigest(filename: str, chunkSize: int = 1 << 20) -> str:
+    """
+    :return: SHA-256 of the bytes of the file (read a chunk at a time)
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as infile:
+        for data in iter(lambda: infile.read(chunkSize), b''):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def normalizedDigest(lines: Iterable[str]) -> str:
+    """
+    :param lines: lines such as from readNormalizedLines
+    :return: SHA-256 of the lines so two files are the same after normalizing if their digests are the same
+    """
+    digest = hashlib.sha256()
+    for line in lines:
+        digest.update(line.encode('utf-8', 'surrogateescape'))
+        # lines never contain a newline after normalizing so it separates them
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+# ----------------------------------------------------------------------
+
+def stripAndRemoveEmptyLines(lines: list, leadingWhiteSpace: bool = False, blankLinesAtBeginning: bool = False, allBlankLines: bool = False):
+    """
+    modifies lines in place to strip each line and remove blank lines as specified (see normalizedLines)
+    """
+    lines[:] = list(normalizedLines(lines, leadingWhiteSpace, blankLinesAtBeginning, allBlankLines))
 
 # ----------------------------------------------------------------------
 
-def diff(f1Lines, f2Lines, args):
+def diff(f1Lines, f2Lines, args, differentLines: Optional[Iterable[int]] = None):
+    """
+    :param differentLines: if not None, the indices of the lines to report as different (such as from
+    numericDifferentLines) instead of the lines whose strings are not the same
+    """
     output = False
     f1Length = len(f1Lines)
     f2Length = len(f2Lines)
 
-    for i in range(min(len(f1Lines), len(f2Lines))):
-        if f1Lines[i] != f2Lines[i]:
-            print(f'line {i+1} differs')
-            print(f1Lines[i])
-            print(f2Lines[i])
-            output = True
+    if differentLines is None:
+        differentLines = (i for i in range(min(len(f1Lines), len(f2Lines))) if f1Lines[i] != f2Lines[i])
+    for i in differentLines:
+        print(f'line {i+1} differs')
+        print(f1Lines[i])
+        print(f2Lines[i])
+        output = True
 
     if f1Length > f2Length:
         extra = "\n".join(f1Lines[f2Length:])
@@ -71,17 +180,298 @@ def diff(f1Lines, f2Lines, args):
 
 # ----------------------------------------------------------------------
 
+def parseTolerance(tolerance: str) -> Tuple[float, float]:
+    """
+    used as the argparse type for --numeric so a bad value is reported before reading the files
+    :param tolerance: relative and absolute tolerance separated by a slash such as 1e-6/1e-9
+    :return: (relative tolerance, absolute tolerance)
+    """
+    rtol, slash, atol = tolerance.partition('/')
+    try:
+        result = float(rtol), float(atol) if slash else 0.0
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{tolerance} is not RTOL or RTOL/ATOL such as 1e-6/1e-9")
+    if not all(value >= 0 for value in result):
+        raise argparse.ArgumentTypeError(f"tolerances in {tolerance} must not be negative")
+    return result
+
+
+def _parseFloats(tokens: List[str]):
+    """
+    :return: array (list without numpy) of the tokens as floats with nan for tokens that are not numbers
+    """
+    if numpy is not None:
+        try:
+            # numpy parses the whole list at once when every token is a number
+            return numpy.array(tokens, dtype=numpy.float64)
+        except ValueError:
+            pass
+    else:
+        try:
+            return list(map(float, tokens))
+        except ValueError:
+            pass
+    values = []
+    for token in tokens:
+        try:
+            values.append(float(token))
+        except ValueError:
+            values.append(math.nan)
+    if numpy is not None:
+        return numpy.array(values, dtype=numpy.float64)
+    return values
+
+
+def numericDifferentLines(f1Lines: Sequence[str], f2Lines: Sequence[str], rtol: float, atol: float) -> List[int]:
+    """
+    compares the lines a word at a time with numbers that are within the tolerance of each other considered the same;
+    words that are not numbers must be the same; all the numbers are parsed and compared at once (using numpy if installed)
+    :param f1Lines: expected lines
+    :param f2Lines: lines to compare
+    :param rtol: relative tolerance (compared to the absolute value of the number in f1Lines)
+    :param atol: absolute tolerance
+    :return: sorted list of the indices of the lines that differ (only lines in both are checked)
+    """
+    different = set()
+    # index of the line for each pair of words that are not the same string
+    pairLines = []
+    words1 = []
+    words2 = []
+    for i in range(min(len(f1Lines), len(f2Lines))):
+        line1 = f1Lines[i]
+        line2 = f2Lines[i]
+        if line1 == line2:
+            continue
+        tokens1 = line1.split()
+        tokens2 = line2.split()
+        if len(tokens1) != len(tokens2):
+            different.add(i)
+            continue
+        for token1, token2 in zip(tokens1, tokens2):
+            if token1 != token2:
+                pairLines.append(i)
+                words1.append(token1)
+                words2.append(token2)
+
+    values1 = _parseFloats(words1)
+    values2 = _parseFloats(words2)
+    # nan (words that are not numbers) is never close so those lines differ
+    if numpy is not None and len(pairLines) > 0:
+        close = numpy.abs(values1 - values2) <= atol + rtol * numpy.abs(values1)
+        different.update(numpy.asarray(pairLines)[~close].tolist())
+    else:
+        for i, value1, value2 in zip(pairLines, values1, values2):
+            if not abs(value1 - value2) <= atol + rtol * abs(value1):
+                different.add(i)
+    return sorted(different)
+
+# ----------------------------------------------------------------------
+
+def streamDiff(f1Lines: Iterable[str], f2Lines: Iterable[str], args, maxDiffLines: Optional[int] = None, maxDiffBytes: Optional[int] = None):
+    """
+    same output as diff but reads the lines in lockstep so only the current line of each file is in memory
+    :param f1Lines: iterator for lines of file1 such as from readNormalizedLines
+    :param f2Lines: iterator for lines of file2 such as from readNormalizedLines
+    :param args: command line arguments (uses file1 and file2)
+    :param maxDiffLines: if not None, stop after this many lines that differ or are extra
+    :param maxDiffBytes: if not None, stop after printing this many characters of lines that differ or are extra
+    """
+    output = False
+    diffLines = 0
+    diffBytes = 0
+    extraIn = None
+    # None marks the end of a file as a line is never None
+    for i, (line1, line2) in enumerate(itertools.zip_longest(f1Lines, f2Lines)):
+        if line1 is not None and line2 is not None:
+            if line1 == line2:
+                continue
+            print(f'line {i+1} differs')
+            print(line1)
+            print(line2)
+            diffBytes += len(line1) + len(line2)
+        else:
+            if extraIn is None:
+                extraIn = args.file1 if line2 is None else args.file2
+                print(f'extra lines in {extraIn}')
+            line = line1 if line2 is None else line2
+            print(line)
+            diffBytes += len(line)
+        output = True
+        diffLines += 1
+        if (maxDiffLines is not None and diffLines >= maxDiffLines) or (maxDiffBytes is not None and diffBytes >= maxDiffBytes):
+            print(f'stopping after {diffLines} different lines')
+            break
+
+    # print a blank line at end if we output anything
+    if output:
+        print()
+
+# ----------------------------------------------------------------------
+
+def _middleSnake(a: Sequence[str], aLo: int, aHi: int, b: Sequence[str], bLo: int, bHi: int, limit: Optional[int] = None):
+    """
+    Myers' linear space middle snake: searches forward from the start and backward from the end
+    until the paths overlap using space proportional to the number of lines
+    :param limit: if not None, give up after this many steps in each direction
+    :return: (number of edits, x start, y start, x end, y end) of the snake relative to aLo, bLo or None if limit is reached
+    """
+    n = aHi - aLo
+    m = bHi - bLo
+    delta = n - m
+    odd = delta % 2 != 0
+    maxD = (n + m + 1) // 2
+    if limit is not None:
+        maxD = min(maxD, limit)
+    # lists indexed by diagonal + offset as diagonals can be negative
+    offset = maxD + 1
+    forward = [0] * (2 * maxD + 3)
+    backward = [0] * (2 * maxD + 3)
+    for d in range(maxD + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+            y = x - k
+            xStart, yStart = x, y
+            while x < n and y < m and a[aLo + x] == b[bLo + y]:
+                x += 1
+                y += 1
+            forward[offset + k] = x
+            # the backward path on this diagonal is delta - k in the backward coordinates
+            if odd and -(d - 1) <= delta - k <= d - 1 and x + backward[offset + delta - k] >= n:
+                return 2 * d - 1, xStart, yStart, x, y
+
+        for c in range(-d, d + 1, 2):
+            if c == -d or (c != d and backward[offset + c - 1] < backward[offset + c + 1]):
+                x = backward[offset + c + 1]
+            else:
+                x = backward[offset + c - 1] + 1
+            y = x - c
+            xStart, yStart = x, y
+            while x < n and y < m and a[aHi - x - 1] == b[bHi - y - 1]:
+                x += 1
+                y += 1
+            backward[offset + c] = x
+            if not odd and -d <= delta - c <= d and x + forward[offset + delta - c] >= n:
+                return 2 * d, n - x, m - y, n - xStart, m - yStart
+    return None
+
+
+def _alignRange(a: Sequence[str], aLo: int, aHi: int, b: Sequence[str], bLo: int, bHi: int, hunks: list, limit: Optional[int] = None) -> Optional[int]:
+    """
+    appends the differences between a[aLo:aHi] and b[bLo:bHi] to hunks
+    :return: number of edits or None if more than 2 * limit
+    """
+    # lines at the beginning and end that are the same are not part of any difference
+    while aLo < aHi and bLo < bHi and a[aLo] == b[bLo]:
+        aLo += 1
+        bLo += 1
+    while aLo < aHi and bLo < bHi and a[aHi - 1] == b[bHi - 1]:
+        aHi -= 1
+        bHi -= 1
+
+    if aLo == aHi or bLo == bHi:
+        # only lines deleted from a or inserted from b; join them to the previous hunk if it ends here
+        if aLo != aHi or bLo != bHi:
+            if len(hunks) > 0 and hunks[-1][1] == aLo and hunks[-1][3] == bLo:
+                i1, i2, j1, j2 = hunks.pop()
+                hunks.append((i1, aHi, j1, bHi))
+            else:
+                hunks.append((aLo, aHi, bLo, bHi))
+        return (aHi - aLo) + (bHi - bLo)
+
+    snake = _middleSnake(a, aLo, aHi, b, bLo, bHi, limit)
+    if snake is None:
+        return None
+    edits, xStart, yStart, xEnd, yEnd = snake
+    # each half has at most half the edits so the recursion does not need the limit
+    _alignRange(a, aLo, aLo + xStart, b, bLo, bLo + yStart, hunks)
+    _alignRange(a, aLo + xEnd, aHi, b, bLo + yEnd, bHi, hunks)
+    return edits
+
+
+def alignedDifferences(f1Lines: Sequence[str], f2Lines: Sequence[str], maxEdits: int) -> Optional[List[Tuple[int, int, int, int]]]:
+    """
+    finds the fewest lines to delete from f1Lines and insert from f2Lines to make them the same (Myers' algorithm)
+    in time proportional to the number of lines times the number of differences
+    :param f1Lines: lines of the first file
+    :param f2Lines: lines of the second file
+    :param maxEdits: give up if more than this many lines need deleted or inserted
+    :return: list of (i1, i2, j1, j2) meaning f1Lines[i1:i2] is replaced by f2Lines[j1:j2] or None if more than maxEdits
+    """
+    hunks = []
+    edits = _alignRange(f1Lines, 0, len(f1Lines), f2Lines, 0, len(f2Lines), hunks, (maxEdits + 1) // 2)
+    if edits is None or edits > maxEdits:
+        return None
+    return hunks
+
+
+def alignedDiff(f1Lines: Sequence[str], f2Lines: Sequence[str], args, maxEdits: int = 1000):
+    """
+    prints the lines that differ after aligning the files so a missing or extra line only reports that line;
+    uses diff if there are more than maxEdits lines to delete or insert
+    :param f1Lines: list of lines of file1
+    :param f2Lines: list of lines of file2
+    :param args: command line arguments (uses file1 and file2)
+    :param maxEdits: maximum number of lines to delete or insert before giving up on aligning
+    """
+    hunks = alignedDifferences(f1Lines, f2Lines, maxEdits)
+    if hunks is None:
+        print(f'more than {maxEdits} lines to insert or delete so comparing line by line')
+        diff(f1Lines, f2Lines, args)
+        return
+
+    for i1, i2, j1, j2 in hunks:
+        # lines replaced by the same number of lines are reported the same way as diff
+        changed = min(i2 - i1, j2 - j1)
+        for offset in range(changed):
+            i = i1 + offset
+            j = j1 + offset
+            if i == j:
+                print(f'line {i+1} differs')
+            else:
+                print(f'line {i+1} of {args.file1} differs from line {j+1} of {args.file2}')
+            print(f1Lines[i])
+            print(f2Lines[j])
+        for i in range(i1 + changed, i2):
+            print(f'line {i+1} of {args.file1} missing from {args.file2}')
+            print(f1Lines[i])
+        for j in range(j1 + changed, j2):
+            print(f'line {j+1} of {args.file2} extra compared to {args.file1}')
+            print(f2Lines[j])
+
+    # print a blank line at end if we output anything
+    if len(hunks) > 0:
+        print()
+
+# ----------------------------------------------------------------------
+
 def main():
     parser = argparse.ArgumentParser(description='diff ignoring trailing spaces and blank lines at end')
     parser.add_argument('-a', '--all', dest='removeAllBlankLines', action='store_true', help='remove any blank lines')
     parser.add_argument('-b', '--beginning', dest='removeBlankLinesAtBeginning', action='store_true', help='remove blank lines at beginning')
     parser.add_argument('-l', '--leading', dest='leading', action='store_true', help='ignore leading whitespace')
     parser.add_argument('-w', '--write', dest='write', action='store_true', help='write out updated files performing operations specified by flags instead of diffing')
+    parser.add_argument('-s', '--stream', dest='stream', action='store_true', help='compare the files a line at a time instead of reading them into memory')
+    parser.add_argument('--max-lines', dest='maxDiffLines', type=int, default=None, help='with --stream, stop after this many different lines')
+    parser.add_argument('--max-bytes', dest='maxDiffBytes', type=int, default=None, help='with --stream, stop after this many characters of different lines')
+    parser.add_argument('--max-line-length', dest='maxLineLength', type=int, default=1 << 16, help='with --stream, only keep this many characters of each line (the rest is compared by its hash)')
+    parser.add_argument('--numeric', dest='numeric', type=parseTolerance, default=None, metavar='RTOL/ATOL', help='numbers in the files are the same if within the relative/absolute tolerance such as 1e-6/1e-9')
+    parser.add_argument('--align', dest='align', action='store_true', help='align the files so missing or extra lines are reported as such instead of every later line differing')
+    parser.add_argument('--max-edits', dest='maxEdits', type=int, default=1000, help='with --align, compare line by line if more than this many lines are missing or extra')
     
     parser.add_argument('file1', type=str)
     parser.add_argument('file2', type=str)
     parser.set_defaults(removeBlankAtBeginning=False, removeAllBlankLines=False, leading=False)
     args = parser.parse_args()
+    # each of these compares the whole files in a different way so they cannot be combined
+    if args.stream and args.numeric is not None:
+        parser.error('--stream cannot be used with --numeric')
+    if args.stream and args.align:
+        parser.error('--stream cannot be used with --align')
+    if args.numeric is not None and args.align:
+        parser.error('--numeric cannot be used with --align')
     
     ok = True
     if not os.path.exists(args.file1):
@@ -94,16 +484,27 @@ def main():
     
     if not ok:
         return
+
+    # most files are exactly the same or only differ in whitespace so check that
+    # without creating lists of lines before doing the comparison that reports differences
+    if not args.write:
+        if filesIdentical(args.file1, args.file2):
+            return
+    # --stream already reads each file once and stops at --max-lines/--max-bytes so it skips the digests
+    if not args.write and not args.stream:
+        flags = (args.leading, args.removeBlankLinesAtBeginning, args.removeAllBlankLines)
+        if normalizedDigest(readNormalizedLines(args.file1, *flags)) == normalizedDigest(readNormalizedLines(args.file2, *flags)):
+            return
+
+    if args.stream and not args.write:
+        f1Lines = readNormalizedLines(args.file1, args.leading, args.removeBlankLinesAtBeginning, args.removeAllBlankLines, args.maxLineLength)
+        f2Lines = readNormalizedLines(args.file2, args.leading, args.removeBlankLinesAtBeginning, args.removeAllBlankLines, args.maxLineLength)
+        streamDiff(f1Lines, f2Lines, args, args.maxDiffLines, args.maxDiffBytes)
+        return
     
-    # read lines from both files
-    with open(args.file1, 'r') as infile:
-        f1Lines = infile.readlines()
-    with open(args.file2, 'r') as infile:
-        f2Lines = infile.readlines()
-    
-    # remove lines as specified by arguments
-    stripAndRemoveEmptyLines(f1Lines, args.leading, args.removeBlankLinesAtBeginning, args.removeAllBlankLines)
-    stripAndRemoveEmptyLines(f2Lines, args.leading, args.removeBlankLinesAtBeginning, args.removeAllBlankLines)
+    # read lines from both files removing lines as specified by arguments
+    f1Lines = list(readNormalizedLines(args.file1, args.leading, args.removeBlankLinesAtBeginning, args.removeAllBlankLines))
+    f2Lines = list(readNormalizedLines(args.file2, args.leading, args.removeBlankLinesAtBeginning, args.removeAllBlankLines))
     
     # if write argument, write them back out to original files
     if args.write:
@@ -115,6 +516,11 @@ def main():
         with open(args.file2, 'w') as outfile:
             outfile.writelines(f2String)
 
+    elif args.numeric is not None:
+        rtol, atol = args.numeric
+        diff(f1Lines, f2Lines, args, numericDifferentLines(f1Lines, f2Lines, rtol, atol))
+    elif args.align:
+        alignedDiff(f1Lines, f2Lines, args, args.maxEdits)
     else:
         diff(f1Lines, f2Lines, args)
     
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+# ----------------------------------------------------------------------
+# myDiffAll.py
+# Dave Reed
+# 10/17/2026
+# ----------------------------------------------------------------------
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import os.path
+from typing import List, Optional
+
+from FileUtils import *
+from myDiff import readNormalizedLines, alignedDifferences, fileDigest, normalizedDigest
+
+# ----------------------------------------------------------------------
+
+# set in each worker process by _initWorker so the expected output is only sent to each worker once
+_expected: dict = {}
+_options = None
+
+
+def _initWorker(expected: dict, options):
+    global _expected, _options
+    _expected = expected
+    _options = options
+
+# ----------------------------------------------------------------------
+
+def compareLines(expectedLines: List[str], lines: List[str], maxEdits: Optional[int] = None):
+    """
+    :param expectedLines: normalized lines of the expected output
+    :param lines: normalized lines of the student's output
+    :param maxEdits: if not None, count lines inserted and deleted after aligning them (see myDiff.alignedDifferences)
+    and compare line by line if there are more than maxEdits
+    :return: (line number of first difference or None if the same, number of lines that differ)
+    """
+    if maxEdits is not None:
+        hunks = alignedDifferences(expectedLines, lines, maxEdits)
+        if hunks is not None:
+            if len(hunks) == 0:
+                return None, 0
+            return min(hunks[0][0], hunks[0][2]) + 1, sum(max(i2 - i1, j2 - j1) for i1, i2, j1, j2 in hunks)
+
+    # same as myDiff.diff: each line that differs plus the extra lines in the longer one
+    differentLines = abs(len(expectedLines) - len(lines))
+    firstDifference = None
+    for i, (expected, line) in enumerate(zip(expectedLines, lines)):
+        if expected != line:
+            differentLines += 1
+            if firstDifference is None:
+                firstDifference = i + 1
+    if firstDifference is None and differentLines > 0:
+        firstDifference = min(len(expectedLines), len(lines)) + 1
+    return firstDifference, differentLines
+
+# ----------------------------------------------------------------------
+
+def compareStudent(studentPath: str) -> dict:
+    """
+    compares the output file in the student's directory with the expected output given to _initWorker
+    by checking the size and digest of the file, then the digest of its normalized lines,
+    and only reading it into lines to compare if both differ
+    :param studentPath: path to Grade/<email> directory
+    :return: dictionary with student, status (pass, fail, or missing), firstDifference, and differentLines
+    """
+    student = FileInfo(studentPath).fileName()
+    path = FileInfo(studentPath, _options.outputFile).filePath()
+    if not os.path.exists(path):
+        return {"student": student, "status": "missing", "firstDifference": None, "differentLines": None}
+
+    passed = {"student": student, "status": "pass", "firstDifference": None, "differentLines": 0}
+    if os.path.getsize(path) == _expected["size"] and fileDigest(path) == _expected["digest"]:
+        return passed
+    flags = (_options.leading, _options.removeBlankLinesAtBeginning, _options.removeAllBlankLines)
+    if normalizedDigest(readNormalizedLines(path, *flags)) == _expected["normalizedDigest"]:
+        return passed
+
+    lines = list(readNormalizedLines(path, *flags))
+    maxEdits = _options.maxEdits if _options.align else None
+    firstDifference, differentLines = compareLines(_expected["lines"], lines, maxEdits)
+    status = "pass" if differentLines == 0 else "fail"
+    return {"student": student, "status": status, "firstDifference": firstDifference, "differentLines": differentLines}
+
+# ----------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description='''compare one expected output file against the output file
+    in every student directory in the Grade directory using a pool of processes''')
+    parser.add_argument('-a', '--all', dest='removeAllBlankLines', action='store_true', help='remove any blank lines')
+    parser.add_argument('-b', '--beginning', dest='removeBlankLinesAtBeginning', action='store_true', help='remove blank lines at beginning')
+    parser.add_argument('-l', '--leading', dest='leading', action='store_true', help='ignore leading whitespace')
+    parser.add_argument('--align', dest='align', action='store_true', help='align the files so missing or extra lines only count once')
+    parser.add_argument('--max-edits', dest='maxEdits', type=int, default=1000, help='with --align, compare line by line if more than this many lines are missing or extra')
+    parser.add_argument('-d', '--directory', dest='directory', default='Grade', help='directory containing a directory for each student')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=os.cpu_count(), help='number of processes to use')
+    parser.add_argument('--json', dest='jsonFile', default=None, help='also write the results to this JSON file')
+    parser.add_argument('expectedFile', type=str, help='file with the expected output')
+    parser.add_argument('outputFile', type=str, help='name of the output file in each student directory')
+    options = parser.parse_args()
+
+    if not os.path.exists(options.expectedFile):
+        print(f'{options.expectedFile} does not exist')
+        return
+
+    # normalize and hash the expected output once instead of once per student
+    expectedLines = list(readNormalizedLines(options.expectedFile, options.leading, options.removeBlankLinesAtBeginning, options.removeAllBlankLines))
+    expected = {"lines": expectedLines, "size": os.path.getsize(options.expectedFile),
+                "digest": fileDigest(options.expectedFile), "normalizedDigest": normalizedDigest(expectedLines)}
+
+    studentPaths = sorted(DirectoryInfo(options.directory).directories())
+    with ProcessPoolExecutor(max_workers=options.jobs, initializer=_initWorker, initargs=(expected, options)) as executor:
+        results = list(executor.map(compareStudent, studentPaths, chunksize=8))
+
+    for result in results:
+        if result["status"] == "pass":
+            print(f'{result["student"]}: pass')
+        elif result["status"] == "missing":
+            print(f'{result["student"]}: missing {options.outputFile}')
+        else:
+            print(f'{result["student"]}: fail starting at line {result["firstDifference"]} ({result["differentLines"]} lines differ)')
+
+    counts = {status: sum(1 for result in results if result["status"] == status) for status in ("pass", "fail", "missing")}
+    print(f'{counts["pass"]} pass, {counts["fail"]} fail, {counts["missing"]} missing')
+
+    if options.jsonFile is not None:
+        with open(options.jsonFile, 'w') as outfile:
+            json.dump({"expectedFile": options.expectedFile, "outputFile": options.outputFile, "results": results}, outfile, indent=2)
+
+# ----------------------------------------------------------------------
+
+if __name__ == '__main__':
+    main()
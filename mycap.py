@@ -6,58 +6,184 @@
 # 01/02/2020
 # ----------------------------------------------------------------------
 
+import os
 import sys
 import csv
+import tempfile
+from collections import namedtuple
 from myDiff import stripAndRemoveEmptyLines
 
 # ----------------------------------------------------------------------
 
+nameKey = 'Student Name'
+emailKey = 'Preferred Email'
+identifierKey = 'Student ID'
+noteKey = 'Class Level'
+
+rosterHeader = ['lastName', 'firstName', 'middleName', 'primaryEmail', 'identifier', 'note']
+gaHeader = ['Last', 'First', 'Middle', 'Email', 'ID', 'Note']
+
+# one student from a myCap roster with the name already split up
+MyCapStudent = namedtuple('MyCapStudent', ['lastName', 'firstName', 'middleName', 'email', 'identifier', 'note'])
+
+# ----------------------------------------------------------------------
+
+def parseName(name):
+    """
+    :param name: Student Name column from myCap in first middle last order such as "John Q Smith Jr" or "Mary Smith-Jones"
+    :return: (lastName, firstName, middleName) with suffixes removed and hyphens removed from the last name
+    """
+    nameFields = name.replace(",", " ").split()
+    if nameFields[-1].upper() in ("II", "III", "IV", "JR", "JR."):
+        del nameFields[-1]
+    if len(nameFields) == 2:
+        firstName = nameFields[0]
+        middleName = ""
+        lastName = nameFields[1]
+    elif len(nameFields) == 3:
+        firstName = nameFields[0]
+        middleName = nameFields[1]
+        lastName = nameFields[2]
+    else:
+        firstName = nameFields[0]
+        lastName = nameFields[-1]
+        middleName = " ".join(nameFields[1:-1])
+    return lastName.replace('-', ''), firstName, middleName
+
+
+def readStudents(ifnames):
+    """
+    :param ifnames: roster file downloaded from myCap or list of them
+    :return: generator of MyCapStudent for each student in each file in order
+    """
+    if isinstance(ifnames, str):
+        ifnames = [ifnames]
+    for ifname in ifnames:
+        with open(ifname, newline='') as csvfile:
+            reader = csv.DictReader(csvfile)
+            for row in reader:
+                lastName, firstName, middleName = parseName(row[nameKey])
+                yield MyCapStudent(lastName, firstName, middleName, row[emailKey], row[identifierKey], row[noteKey])
+
+# ----------------------------------------------------------------------
+
+class CSVSink:
+    """
+    writes students to a CSV file with the given header using csv.writer;
+    the file is written to a temporary file in the same directory and only renamed to path by close
+    so it is never partially written
+    """
+
+    def __init__(self, path, header):
+        """
+        :param path: path for the CSV file
+        :param header: list of column names for the first line
+        """
+        self.path = path
+        # unique name since several files converted at the same time may be for the same course
+        self._outfile = tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path) or '.',
+                                                    prefix=os.path.basename(path), delete=False, newline='')
+        self._writer = csv.writer(self._outfile, lineterminator='\n')
+        self._writer.writerow(header)
+
+    def write(self, student):
+        """
+        :param student: MyCapStudent to write
+        """
+        self._writer.writerow(self.row(student))
+
+    def row(self, student):
+        """
+        :return: list of the columns for the student; subclasses can override it for other formats
+        """
+        return list(student)
+
+    def close(self):
+        self._outfile.close()
+        # temporary files are only readable by the owner
+        os.chmod(self._outfile.name, 0o644)
+        os.replace(self._outfile.name, self.path)
+
+    def abort(self):
+        """
+        removes the temporary file without replacing path
+        """
+        self._outfile.close()
+        os.remove(self._outfile.name)
+
+
+class RosterSink(CSVSink):
+    """
+    roster.csv format used by RosterInfo
+    """
+
+    def __init__(self, path='roster.csv'):
+        super().__init__(path, rosterHeader)
+
+
+class GASink(CSVSink):
+    """
+    ga.csv format
+    """
+
+    def __init__(self, path='ga.csv'):
+        super().__init__(path, gaHeader)
+
+# ----------------------------------------------------------------------
+
+def convertRosters(ifnames, sinks):
+    """
+    reads the myCap roster files once, parsing each name once, and writes each student to every sink;
+    if reading fails, no sink replaces its file
+    :param ifnames: roster file downloaded from myCap or list of them
+    :param sinks: list of objects with write(student), close(), and abort() such as RosterSink and GASink
+    :return: number of students
+    """
+    count = 0
+    try:
+        for student in readStudents(ifnames):
+            for sink in sinks:
+                sink.write(student)
+            count += 1
+    except BaseException:
+        for sink in sinks:
+            sink.abort()
+        raise
+
+    for sink in sinks:
+        sink.close()
+    return count
+
+
+def convertRoster(ifname, rosterPath=None, gaPath=None):
+    """
+    reads the myCap roster file once and writes the roster.csv and/or ga.csv formats
+    :param ifname: roster file downloaded from myCap
+    :param rosterPath: path for the roster.csv format or None to not write it
+    :param gaPath: path for the ga.csv format or None to not write it
+    :return: number of students
+    """
+    sinks = []
+    if rosterPath is not None:
+        sinks.append(RosterSink(rosterPath))
+    if gaPath is not None:
+        sinks.append(GASink(gaPath))
+    return convertRosters(ifname, sinks)
+
+# ----------------------------------------------------------------------
+
 def main(argv):
 
     if len(argv) == 1:
-        ifname = input('enter filename: ')
+        ifnames = [input('enter filename: ')]
     else:
-        ifname = argv[1]
-        
-    nameKey = 'Student Name'
-    emailKey = 'Preferred Email'
-    identifierKey = 'Student ID'
-    noteKey = 'Class Level'
-    
+        ifnames = argv[1:]
+
+    # all the files are combined into one output file
     if 'ga' in argv[0]:
-        headerLine = 'Last,First,Middle,Email,ID,Note'
-        ofname = 'ga.csv'
+        convertRosters(ifnames, [GASink()])
     else:
-        headerLine = 'lastName,firstName,middleName,primaryEmail,identifier,note'
-        ofname = 'roster.csv'
-        
-    with open(ofname, 'w') as outfile:
-        print(headerLine, file=outfile)
-        
-        with open(ifname) as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                name = row[nameKey].replace(",", " ")
-                email = row[emailKey]
-                identifier = row[identifierKey]
-                note = row[noteKey].replace(",", " ")
-                nameFields = name.split()
-                if nameFields[-1].upper() in ("II", "III", "IV", "JR", "JR."):
-                    del nameFields[-1]
-                if len(nameFields) == 2:
-                    firstName = nameFields[0]
-                    middleName = ""
-                    lastName = nameFields[1]
-                elif len(nameFields) == 3:
-                    firstName = nameFields[0]
-                    middleName = nameFields[1]
-                    lastName = nameFields[2]
-                else:
-                    firstName = nameFields[0]
-                    lastName = nameFields[-1]
-                    middleName = " ".join(nameFields[1:-1])
-                    
-                print(f"{lastName.replace('-', '')},{firstName},{middleName},{email},{identifier},{note}", file=outfile)
+        convertRosters(ifnames, [RosterSink()])
 
 # ----------------------------------------------------------------------
 
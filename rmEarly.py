@@ -7,36 +7,76 @@
 # ----------------------------------------------------------------------
 
 from argparse import ArgumentParser
-import glob
+from concurrent.futures import ThreadPoolExecutor
+import filecmp
 import os
 import shutil
 
 from FileUtils import *
 
 
+def sameContents(paths):
+    """
+    only the files submitted to Grade are compared so hidden files (such as .DS_Store) and files created
+    by running the tests in Early (such as __pycache__ or output files) do not make them different
+    :param paths: (path to directory in Grade, path to same directory in Early)
+    :return: True if every non-hidden file in the Grade directory is in the Early directory with the same contents,
+    False if not, or None if the Grade directory has no non-hidden files to compare
+    """
+    gradePath, earlyPath = paths
+    files = DirectoryInfo(gradePath, recursive=True).allFiles()
+    if len(files) == 0:
+        return None
+    for path in files:
+        earlyFile = os.path.join(earlyPath, os.path.relpath(path, gradePath))
+        if not os.path.isfile(earlyFile) or not filecmp.cmp(path, earlyFile, shallow=False):
+            return False
+    return True
+
+
 def main():
     parser = ArgumentParser(description='''
     delete early submissions
     use from ~/Labs/<courseDir>; 
-    by default it removes any directories in Grade directory that are also in Early directory;
+    by default it removes any directories in Grade directory that are also in Early directory with the same contents;
     can specify the directories with -e and -d''')
 
     parser.add_argument("-e", "--earlyDirectory", dest="earlyDirectory", default='Early')
     parser.add_argument("-d", "--directory", dest="directory", default='Grade')
+    parser.add_argument("-j", "--jobs", dest="jobs", type=int, default=os.cpu_count(),
+                        help='number of directories to compare and remove at the same time')
+    parser.add_argument("-n", "--dry-run", dest="dryRun", action='store_true',
+                        help='print the directories that would be removed without removing them')
 
     options = parser.parse_args()
 
     earlyDir = options.earlyDirectory
     directory = options.directory
 
-    earlyDirectories = [FileInfo(d).fileName() for d in DirectoryInfo(earlyDir).directories()]
+    earlyDirectories = {FileInfo(d).fileName(): d for d in DirectoryInfo(earlyDir).directories()}
 
-    directoryPaths = DirectoryInfo(directory).directories()
-    for path in directoryPaths:
+    pairs = []
+    for path in sorted(DirectoryInfo(directory).directories()):
         d = FileInfo(path).fileName()
         if d in earlyDirectories:
-            print(f"/bin/rm -rf {path}")
-            shutil.rmtree(path)
+            pairs.append((path, earlyDirectories[d]))
+
+    with ThreadPoolExecutor(max_workers=max(1, options.jobs)) as executor:
+        same = list(executor.map(sameContents, pairs))
+        removePaths = [gradePath for (gradePath, earlyPath), isSame in zip(pairs, same) if isSame]
+        for (gradePath, earlyPath), isSame in zip(pairs, same):
+            if isSame is None:
+                print(f"{gradePath} has no files to compare with {earlyPath}; not removing it")
+            elif not isSame:
+                print(f"{gradePath} differs from {earlyPath}; not removing it")
+
+        for path in removePaths:
+            if options.dryRun:
+                print(f"would remove {path}")
+            else:
+                print(f"/bin/rm -rf {path}")
+        if not options.dryRun:
+            list(executor.map(shutil.rmtree, removePaths))
 
 # ----------------------------------------------------------------------
 
@@ -8,9 +8,12 @@
 
 
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 import glob
 import os
 
+from mycap import convertRoster
+
 def readEnvVar(envVar="ROSTERS"):
     try:
         info = os.getenv(envVar)
@@ -65,6 +68,8 @@ def main():
 
     files.sort()
     outputLines = []
+    # (myCap file, roster.csv path, ga.csv path) for each file
+    conversions = []
     
     courseDict = readEnvVar()
     # save since we remove them from courseDict as we match them up
@@ -132,26 +137,24 @@ def main():
         destDir = envDict[selectedCourse]
         destDir = destDir[:destDir.rfind(os.sep)]
 
-        #cmd = f"$HOME/Scripts/myCap.py '{f}'"
-        # so can work if mycap.py is in PATH with my SharedScripts repo
-        cmd = f"myCap.py '{f}'"
-        os.system(cmd)
-
-        if isMath and "CS481" in destDir:
-            cmd = f"mv roster.csv {destDir}/math-roster.csv"
-        else:
-            cmd = f"mv roster.csv {destDir}/roster.csv"
-        os.system(cmd)
-        
-        #cmd = f"$HOME/Scripts/myCap2ga.py '{f}'"
-        # so can work if mycap.py is in PATH with my SharedScripts repo
-        cmd = f"myCap2ga.py '{f}'"
-        os.system(cmd)
         if isMath and "CS481" in destDir:
-            cmd = f"mv ga.csv {destDir}/math-ga.csv"
+            conversions.append((f, f"{destDir}/math-roster.csv", f"{destDir}/math-ga.csv"))
         else:
-            cmd = f"mv ga.csv {destDir}/ga.csv"
-        os.system(cmd)
+            conversions.append((f, f"{destDir}/roster.csv", f"{destDir}/ga.csv"))
+
+    # CS481 and MATH courses stay in courseDict so several files can have the same destination;
+    # those are converted in order (so the last file wins as before) and different destinations at the same time
+    groups = {}
+    for conversion in conversions:
+        groups.setdefault(conversion[1:], []).append(conversion)
+
+    def convertGroup(group):
+        for conversion in group:
+            convertRoster(*conversion)
+
+    # choosing the courses may ask the user so it is done above
+    with ThreadPoolExecutor() as executor:
+        list(executor.map(convertGroup, groups.values()))
 
     print()
     print("\n".join(outputLines))
@@ -7,19 +7,196 @@
 #----------------------------------------------------------------------
 
 import os, sys, os.path
+import argparse
+import hashlib
+import json
+import signal
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from FileUtils import directoryContentHash, writeFileAtomically
+
+#----------------------------------------------------------------------
+
+def limitMemory(run_com, memoryMB):
+    """
+    :param memoryMB: limit for the virtual memory of the command in megabytes
+    :return: shell command that sets the limit with ulimit (so it only applies to this command) before running run_com
+    and writes a message to stderr if the limit cannot be set (such as on macOS)
+    """
+    # ulimit in the shell instead of preexec_fn since preexec_fn is not safe with the threads used for --jobs
+    message = f"run_dir.py: unable to limit memory to {memoryMB} MB; running without a limit"
+    return f"ulimit -v {memoryMB * 1024} 2>/dev/null || echo '{message}' >&2; {run_com}"
+
+
+def killGroup(proc):
+    "kills the process started in a new session and everything it started"
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def runInDirectory(d, run_com, timeout=None, memoryMB=None, captureInput=True, captureOutput=True):
+    """
+    runs the command using the shell with d as the current directory
+    :param d: directory to run the command in
+    :param run_com: shell command to run
+    :param timeout: if not None, kill the command (and anything it started) after this many seconds
+    :param memoryMB: if not None, limit the virtual memory of the command to this many megabytes
+    :param captureInput: if True, the command reads from /dev/null instead of the terminal
+    :param captureOutput: if True, stdout and stderr are captured and returned; otherwise the command writes
+    to the terminal as it runs (so prompts show up) and stdout and stderr are empty
+    :return: dictionary with directory, command, returncode, timedOut, seconds, stdout, and stderr
+    """
+    output = subprocess.PIPE if captureOutput else None
+    com = limitMemory(run_com, memoryMB) if memoryMB is not None else run_com
+    # new session so a timeout can kill everything the command started; without a timeout the command stays
+    # in the terminal's process group so Ctrl-C reaches it
+    newSession = timeout is not None
+
+    start = time.time()
+    proc = subprocess.Popen(com, shell=True, cwd=d, stdout=output, stderr=output,
+                            stdin=subprocess.DEVNULL if captureInput else None, start_new_session=newSession)
+    timedOut = False
+    try:
+        stdout, stderr = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        timedOut = True
+        killGroup(proc)
+        stdout, stderr = proc.communicate()
+    except KeyboardInterrupt:
+        # Ctrl-C does not reach a command in its own session
+        if newSession:
+            killGroup(proc)
+        raise
+
+    return {"directory": d, "command": run_com, "returncode": proc.returncode, "timedOut": timedOut,
+            "seconds": round(time.time() - start, 3),
+            "stdout": stdout.decode(errors='replace') if stdout is not None else "",
+            "stderr": stderr.decode(errors='replace') if stderr is not None else ""}
+
+#----------------------------------------------------------------------
+
+def cacheKey(d, run_com, timeout=None, memoryMB=None):
+    """
+    :return: key for the results cache based on the directory, its contents, and the command
+    (the directory is part of the key so students with the same files still each run the command)
+    """
+    key = f"{os.path.abspath(d)}\0{run_com}\0{timeout}\0{memoryMB}\0{directoryContentHash(d)}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def readCache(cachePath):
+    try:
+        with open(cachePath) as infile:
+            return json.load(infile)
+    except (OSError, ValueError):
+        return {}
+
+
+def writeCache(cachePath, cache):
+    writeFileAtomically(cachePath, lambda outfile: json.dump(cache, outfile))
+
+
+def runWithCache(d, run_com, cache, timeout=None, memoryMB=None, captureInput=True):
+    """
+    uses the result in the cache if the directory has the same contents as when the command was run before;
+    otherwise runs the command and returns the keys to store the result under
+    :return: (result, list of keys to add the result to the cache with)
+    """
+    key = cacheKey(d, run_com, timeout, memoryMB)
+    if key in cache:
+        result = dict(cache[key], directory=d, command=run_com, cached=True)
+        return result, []
+
+    result = runInDirectory(d, run_com, timeout, memoryMB, captureInput)
+    result["cached"] = False
+    if result["timedOut"]:
+        return result, []
+    # the command may create files (such as output or __pycache__) so also store it under the contents after running
+    # so running it again is a hit while extracting the same submission again matches the key from before it ran
+    return result, [key, cacheKey(d, run_com, timeout, memoryMB)]
+
+#----------------------------------------------------------------------
+
+def printHeader(d, run_com, cached=False):
+    if cached:
+        print('d: ', d, '(cached)')
+    else:
+        print('d: ', d)
+    print(f'cd {d}; {run_com}')
+    sys.stdout.flush()
+
+
+def printResult(result, timeout=None, header=True):
+    """
+    :param header: if False, only print the status since the header was printed before running the command
+    """
+    if header:
+        printHeader(result["directory"], result["command"], result.get("cached", False))
+    sys.stdout.write(result["stdout"])
+    sys.stdout.flush()
+    sys.stderr.write(result["stderr"])
+    sys.stderr.flush()
+    if result["timedOut"]:
+        print(f'timed out after {timeout} seconds')
+    elif result["returncode"] != 0:
+        print(f'exit status {result["returncode"]}')
 
 #----------------------------------------------------------------------
 
 def main(argv):
 
-    run_com = argv[1]
-    dirs = argv[2:]
-    for d in dirs:
-        if os.path.isdir(d):
-            print('d: ', d)
-            com = f"cd {d}; {run_com}"
-            print(com)
-            os.system(com)
+    parser = argparse.ArgumentParser(prog=os.path.basename(argv[0]),
+                                     description='run a shell command in each directory')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=1, help='number of directories to run at the same time')
+    parser.add_argument('-t', '--timeout', dest='timeout', type=float, default=None, help='kill the command after this many seconds')
+    parser.add_argument('-m', '--memory', dest='memoryMB', type=int, default=None, help='limit the memory of the command to this many megabytes')
+    parser.add_argument('--json', dest='jsonFile', default=None, help='also write the results to this JSON file')
+    parser.add_argument('-c', '--cache', dest='cacheFile', default=None,
+                        help='JSON file of previous results; directories with the same contents and command are not run again')
+    parser.add_argument('run_com', help='command to run')
+    parser.add_argument('dirs', nargs='*', help='directories to run the command in')
+    options = parser.parse_args(argv[1:])
+
+    run_com = options.run_com
+    dirs = [d for d in options.dirs if os.path.isdir(d)]
+
+    results = []
+    if options.jobs <= 1 and options.jsonFile is None and options.cacheFile is None:
+        # nothing needs the output so the command writes to the terminal as it runs, as os.system did
+        for d in dirs:
+            printHeader(d, run_com)
+            printResult(runInDirectory(d, run_com, options.timeout, options.memoryMB, False, False),
+                        options.timeout, header=False)
+        return
+
+    # output is captured for each directory and printed in the order of the directories
+    cache = readCache(options.cacheFile) if options.cacheFile is not None else None
+    with ThreadPoolExecutor(max_workers=max(1, options.jobs)) as executor:
+        if cache is None:
+            futures = [executor.submit(runInDirectory, d, run_com, options.timeout, options.memoryMB, options.jobs > 1)
+                       for d in dirs]
+        else:
+            futures = [executor.submit(runWithCache, d, run_com, cache, options.timeout, options.memoryMB, options.jobs > 1)
+                       for d in dirs]
+        for future in futures:
+            result = future.result()
+            if cache is not None:
+                result, keys = result
+                for key in keys:
+                    cache[key] = {name: result[name] for name in ("returncode", "timedOut", "seconds", "stdout", "stderr")}
+            printResult(result, options.timeout)
+            results.append(result)
+
+    if cache is not None:
+        writeCache(options.cacheFile, cache)
+
+    if options.jsonFile is not None:
+        with open(options.jsonFile, 'w') as outfile:
+            json.dump(results, outfile, indent=2)
 
 #----------------------------------------------------------------------
 
@@ -7,16 +7,172 @@
 # ----------------------------------------------------------------------
 
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 import glob
+import json
 import os
 import shutil
 import zipfile
+from typing import Dict, List, Optional, Set, Tuple
 from RosterInfo import *
 from FileUtils import *
+from Profiler import NullProfiler, Profiler
 
 
-def checkZip() ->str:
+# ----------------------------------------------------------------------
+
+# replaced by main with a Profiler if --profile or the SUBMISSIONS_PROFILE environment variable is used
+profiler = NullProfiler()
+
+
+def _countMatch(filename: str, result: Optional[EmailFile]):
+    """
+    counts the submission file as matched or unmatched and if a -1, etc. resubmission suffix was removed
+    :param filename: submission filename (with _LATE_ already removed)
+    :param result: result of findStudentBySubmissionFile for filename
+    """
+    if result is None:
+        profiler.count("unmatched")
+    else:
+        profiler.count("matched")
+        # the part after lastfirst_id_id_ is the filename the student submitted
+        if filename.split("_", 3)[-1] != result.filename:
+            profiler.count("resubmissionStripped")
+
+
+def _extractChunk(zipPath: str, entries: List[Tuple[str, str]]):
+    """
+    extracts the entries using its own ZipFile so it can run in a separate thread
+    :param zipPath: path to the zip file
+    :param entries: list of (name in zip file, destination path)
+    """
+    with zipfile.ZipFile(zipPath, "r") as infile:
+        for name, destPath in entries:
+            with infile.open(name) as src, open(destPath, "wb") as outfile:
+                shutil.copyfileobj(src, outfile)
+            if profiler.enabled:
+                profiler.addBytes("extract", infile.getinfo(name).file_size)
+
+
+def extractEntries(zipPath: str, entries: List[Tuple[str, str]], jobs: int = 1):
+    """
+    extracts files from the zip file to the specified destinations using jobs threads
+    (zlib decompression and file writes release the GIL so threads run in parallel)
+    :param zipPath: path to the zip file
+    :param entries: list of (name in zip file, destination path); each destination must be unique
+    :param jobs: number of threads to use
+    """
+    with profiler.stage("extract"):
+        _extractEntries(zipPath, entries, jobs)
+
+
+def _extractEntries(zipPath: str, entries: List[Tuple[str, str]], jobs: int):
+    # create the directories before starting the threads so they do not race to create them
+    for directory in set(os.path.dirname(destPath) for name, destPath in entries):
+        os.makedirs(directory, exist_ok=True)
+
+    if jobs <= 1 or len(entries) <= 1:
+        _extractChunk(zipPath, entries)
+        return
+
+    # balance the chunks by uncompressed size by giving the next largest file to the chunk with the least data
+    with zipfile.ZipFile(zipPath, "r") as infile:
+        sizes = {info.filename: info.file_size for info in infile.infolist()}
+    chunks = [[] for _ in range(min(jobs, len(entries)))]
+    chunkSizes = [0] * len(chunks)
+    for name, destPath in sorted(entries, key=lambda entry: sizes[entry[0]], reverse=True):
+        index = chunkSizes.index(min(chunkSizes))
+        chunks[index].append((name, destPath))
+        chunkSizes[index] += sizes[name]
+
+    with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+        # list forces any exception from a thread to be raised here
+        list(executor.map(lambda chunk: _extractChunk(zipPath, chunk), chunks))
+
+
+def manifestPath() -> str:
+    """
+    :return: path of the manifest of the last submissions.zip that was extracted
+    """
+    home = os.getenv("HOME")
+    return f"{home}/Downloads/submissions-manifest.json"
+
+
+def zipManifest(zipPath: str) -> Dict[str, dict]:
+    """
+    :param zipPath: path to the zip file
+    :return: dictionary with the name of each file in the zip file as the key and its CRC32, size and date as the value
+    """
+    with zipfile.ZipFile(zipPath, "r") as infile:
+        return {info.filename: {"crc": info.CRC, "size": info.file_size, "date": list(info.date_time)}
+                for info in infile.infolist() if not info.is_dir()}
+
+
+def readManifest() -> dict:
+    """
+    :return: manifest written by writeManifest or an empty manifest if there is not one
+    """
+    try:
+        with open(manifestPath()) as infile:
+            return json.load(infile)
+    except (OSError, ValueError):
+        return {"course": None, "entries": {}}
+
+
+def writeManifest(courseName: str, entries: Dict[str, dict]):
+    """
+    :param courseName: name of the course the zip file was extracted for
+    :param entries: manifest entries (from zipManifest) with "dest" set to where each file was put
+    """
+    with open(manifestPath(), "w") as outfile:
+        json.dump({"course": courseName, "entries": entries}, outfile, indent=1)
+
+
+def manifestDelta(course: Course, entries: Dict[str, dict]) -> Optional[Set[str]]:
     """
+    compares the entries of a new zip file with the manifest of the last one extracted for this course,
+    copies "dest" for files that did not change into entries and deletes the files that were removed from the zip file
+    :param course: course (or merged course) the submissions are for
+    :param entries: manifest entries of the new zip file from zipManifest
+    :return: names of the files that are new or changed or None if there is no manifest for this course
+    """
+    manifest = readManifest()
+    if manifest["course"] != course.name():
+        return None
+    oldEntries: Dict[str, dict] = manifest["entries"]
+
+    changed = set()
+    missing = 0
+    for name, entry in entries.items():
+        old = oldEntries.get(name)
+        if old is None or any(old[key] != entry[key] for key in ("crc", "size", "date")):
+            changed.add(name)
+        elif "dest" in old and not os.path.exists(old["dest"]):
+            # extracted before but since removed (such as the Grade directory being deleted) so extract it again
+            changed.add(name)
+            missing += 1
+        elif "dest" in old:
+            entry["dest"] = old["dest"]
+
+    # another file (such as an earlier submission with the same name) may still be using the destination
+    keep = set(entry["dest"] for entry in entries.values() if "dest" in entry)
+    removed = [name for name in oldEntries if name not in entries]
+    for name in removed:
+        dest = oldEntries[name].get("dest")
+        if dest is not None and dest not in keep and os.path.exists(dest):
+            print(f"removing {dest}")
+            os.remove(dest)
+
+    print(f"{len(changed)} new or changed files and {len(removed)} removed files since last extracted")
+    if missing > 0:
+        print(f"{missing} unchanged files were no longer in the Grade directory so they are extracted again")
+    return changed
+
+
+def checkZip(jobs: int = 1, names: Optional[Set[str]] = None) -> str:
+    """
+    :param jobs: number of threads to use to extract the files
+    :param names: if not None, only extract these files (from manifestDelta) and keep what is already extracted
     :return: full path of submissions.zip
     """
     home = os.getenv("HOME")
@@ -25,7 +181,9 @@ def checkZip() ->str:
     submissionsPath = f"{downloads}/submissions"
 
     needsUnzipped = False
-    if os.path.exists(submissionsPath):
+    if names is not None:
+        needsUnzipped = True
+    elif os.path.exists(submissionsPath):
         dirTime = os.path.getmtime(submissionsPath)
         zipTime = os.path.getmtime(zipPath)
         if dirTime < zipTime:
@@ -36,32 +194,135 @@ def checkZip() ->str:
 
     if needsUnzipped:
         with zipfile.ZipFile(zipPath, "r") as infile:
-            infile.extractall(submissionsPath)
+            if jobs <= 1 and names is None:
+                with profiler.stage("extract"):
+                    infile.extractall(submissionsPath)
+                if profiler.enabled:
+                    profiler.addBytes("extract", sum(info.file_size for info in infile.infolist()))
+            else:
+                entries = []
+                for info in infile.infolist():
+                    if names is not None and info.filename not in names:
+                        continue
+                    # skip anything extractall would not put inside submissionsPath
+                    name = os.path.normpath(info.filename)
+                    if os.path.isabs(name) or name.startswith(".."):
+                        continue
+                    if info.is_dir():
+                        os.makedirs(os.path.join(submissionsPath, name), exist_ok=True)
+                    else:
+                        entries.append((info.filename, os.path.join(submissionsPath, name)))
+        if jobs > 1 or names is not None:
+            os.makedirs(submissionsPath, exist_ok=True)
+            extractEntries(zipPath, entries, jobs)
     else:
         print("does not need unzipped")
     return zipPath
 
 
-def matchFiles(course: Course):
+def gradeDirectory(course: Course, reset: bool = True) -> FileInfo:
+    """
+    removes and recreates the Grade directory for the course
+    :param course: course (or merged course) the submissions are for
+    :param reset: if False, keep the files already in the Grade directory
+    :return: FileInfo for ~/Labs/<course>/Grade
+    """
+    home = os.getenv("HOME")
+    courseName = course.name().split("-")[0]
+    gradePath = FileInfo(home, "Labs", courseName, "Grade")
+    if reset:
+        shutil.rmtree(gradePath.filePath(), True)
+    os.makedirs(gradePath.filePath(), exist_ok=True)
+    return gradePath
+
+
+def extractToGrade(zipPath: str, course: Course, jobs: int = 1, names: Optional[Set[str]] = None) -> Dict[str, str]:
+    """
+    extracts each file in the zip file directly to ~/Labs/<course>/Grade/<email>/
+    instead of extracting everything to ~/Downloads/submissions and then moving the files;
+    files that do not match a student are extracted to ~/Downloads/submissions
+    :param zipPath: path to submissions.zip
+    :param course: course (or merged course) the submissions are for
+    :param jobs: number of threads to use to extract the files
+    :param names: if not None, only extract these files (from manifestDelta) and keep what is already extracted
+    :return: dictionary with the name in the zip file as the key and where it was extracted to as the value
+    """
+    home = os.getenv("HOME")
+    downloads = f"{home}/Downloads"
+    submissionsPath = f"{downloads}/submissions"
+
+    if names is None:
+        # unmatched files from a previous download are not from this zip file
+        shutil.rmtree(submissionsPath, True)
+    gradePath = gradeDirectory(course, names is None)
+
+    # decide where every file goes before extracting any so the result does not depend on the number of jobs;
+    # when several files have the same destination (resubmissions) the last one in the zip file is used
+    destinations: Dict[str, str] = {}
+    unmatched = []
+    with zipfile.ZipFile(zipPath, "r") as infile:
+        for info in infile.infolist():
+            if names is not None and info.filename not in names:
+                continue
+            # zip files always use / as the separator
+            filename = info.filename.rsplit("/", 1)[-1]
+            # skip directories and files such as __MACOSX/._name that start with a period
+            if filename == "" or filename[0] == ".":
+                continue
+            # Canvas adds _LATE_ as part of filename so remove it if it's there
+            if "_LATE_" in filename:
+                profiler.count("lateRenamed")
+                filename = filename.replace("_LATE_", "_")
+            result = course.findStudentBySubmissionFile(filename)
+            if profiler.enabled:
+                _countMatch(filename, result)
+            if result is not None:
+                dest = FileInfo(gradePath.filePath(), result.email, result.filename)
+            else:
+                dest = FileInfo(submissionsPath, filename)
+                if dest.filePath() not in destinations:
+                    unmatched.append(dest.filePath())
+            destinations[dest.filePath()] = info.filename
+
+    extractEntries(zipPath, [(name, destPath) for destPath, name in destinations.items()], jobs)
+
+    if len(unmatched) > 0:
+        print("remaining files")
+        for f in unmatched:
+            print(f)
+    return {name: destPath for destPath, name in destinations.items()}
+
+
+def matchFiles(course: Course, incremental: bool = False) -> Dict[str, str]:
+    """
+    moves the files extracted to ~/Downloads/submissions to ~/Labs/<course>/Grade/<email>/
+    :param course: course (or merged course) the submissions are for
+    :param incremental: if True, keep the files already in the Grade directory
+    :return: dictionary with the name in the zip file as the key and where it was moved to as the value
+    """
     home = os.getenv("HOME")
     downloads = f"{home}/Downloads"
     submissionsPath = f"{downloads}/submissions"
 
     os.chdir(submissionsPath)
     files = glob.glob(f"{submissionsPath}/*")
-    courseName = course.name().split("-")[0]
-    gradePath = FileInfo(home, "Labs", courseName, "Grade")
-    shutil.rmtree(gradePath.filePath(), True)
-    os.makedirs(gradePath.filePath())
+    gradePath = gradeDirectory(course, not incremental)
 
+    destinations = {}
     for f in files:
+        name = os.path.relpath(f, submissionsPath)
         # Canvas adds _LATE_ as part of filename so remove it if it's there
         if "_LATE_" in f:
             newName = f.replace("_LATE_", "_")
             os.rename(f, newName)
             f = newName
+            profiler.count("lateRenamed")
         filename = FileInfo(f).fileName()
         result = course.findStudentBySubmissionFile(filename)
+        if profiler.enabled:
+            _countMatch(filename, result)
+            if result is not None:
+                profiler.addBytes("matchFiles", os.path.getsize(f))
         if result is not None:
             destDir = FileInfo(gradePath.filePath(), result.email)
             dest = FileInfo(destDir.filePath(), result.filename)
@@ -71,33 +332,61 @@ def matchFiles(course: Course):
             # print(dest.filePath())
             # print()
             shutil.move(f, dest.filePath())
+            destinations[name] = dest.filePath()
         else:
             print(f"could not process {f}")
 
-    files = glob.glob(f"{submissionsPath}/*")
+    files = sorted(glob.glob(f"{submissionsPath}/*"))
     if len(files) == 0:
         shutil.rmtree(submissionsPath)
     else:
         print("remaining files")
         for f in files:
             print(f)
+    return destinations
 
 
 def main():
     parser = ArgumentParser(description='extract Canvas submissions')
 
     parser.add_argument("-k", "--keep", dest="keepFiles", default=False, action='store_true')
+    parser.add_argument("-s", "--stream", dest="stream", default=False, action='store_true',
+                        help='extract each file directly to the Grade directory without ~/Downloads/submissions')
+    parser.add_argument("-j", "--jobs", dest="jobs", default=1, type=int,
+                        help='number of threads to use to extract the files')
+    parser.add_argument("-i", "--incremental", dest="incremental", default=False, action='store_true',
+                        help='only extract files that are new or changed since the last submissions.zip for this course')
     parser.add_argument("courseNames", nargs='*', default=None,
                         help='''course names matching environment variables for courses
 examples: 
 submissions.py CS410 or
 submissions.py CS160-12 CS160-1
                 ''')
+    parser.add_argument("--profile", dest="profile", default=os.getenv("SUBMISSIONS_PROFILE"),
+                        help='write the time and bytes for each stage and counts of matched files, etc. to this JSON file '
+                             '(default is the SUBMISSIONS_PROFILE environment variable)')
+    parser.add_argument("--cprofile", dest="cProfile", default=False, action='store_true',
+                        help='with --profile, include the functions that took the most time')
+    parser.add_argument("--tracemalloc", dest="tracemalloc", default=False, action='store_true',
+                        help='with --profile, include the peak memory and largest allocations')
     options = parser.parse_args()
 
+    global profiler
+    if options.profile:
+        profiler = Profiler(options.profile, options.cProfile, options.tracemalloc)
+    profiler.start()
+    try:
+        processSubmissions(options)
+    finally:
+        profiler.finish()
+
+
+def processSubmissions(options):
     # read rosters based on environment variable
     rosterInfo = RosterInfo()
-    rosterInfo.readRostersFromEnvironmentVariable("ROSTERS")
+    # only the rosters for the course are read if it is specified on the command line
+    with profiler.stage("readRosters"):
+        rosterInfo.readRostersFromEnvironmentVariable("ROSTERS", defaultRosterCachePath(), lazy=True)
 
     courseName = None
     if options.courseNames is not None and len(options.courseNames) == 1:
@@ -106,15 +395,21 @@ submissions.py CS160-12 CS160-1
         home = os.getenv("HOME")
         downloads = f"{home}/Downloads"
         zipPath = f"{downloads}/submissions.zip"
-        courseName = rosterInfo.determineCourse(zipPath)
+        with profiler.stage("determineCourse"):
+            courseName = rosterInfo.determineCourse(zipPath)
 
     if courseName is None:
         print(f"could not find course {courseName}")
         return
 
-    course = rosterInfo.courseWithName(courseName)
-    if course is None:
-        course = rosterInfo.mergedCourse(courseName)
+    # reading the rosters is lazy so this is where the course's rosters are read
+    with profiler.stage("readRosters"):
+        course = rosterInfo.courseWithName(courseName)
+        if course is None:
+            course = rosterInfo.mergedCourse(courseName)
+    if profiler.enabled:
+        profiler.addBytes("readRosters", sum(os.path.getsize(c.filename()) for c in rosterInfo.courses()
+                                             if c.isLoaded() and os.path.exists(c.filename())))
 
     # indicate which course
     if course is None:
@@ -123,8 +418,28 @@ submissions.py CS160-12 CS160-1
     else:
         print(f"unzipping for {course}")
 
-    zipPath = checkZip()
-    matchFiles(course)
+    # record what is in the zip file so a later download can be extracted with --incremental
+    zipPath = f"{os.getenv('HOME')}/Downloads/submissions.zip"
+    with profiler.stage("manifest"):
+        entries = zipManifest(zipPath)
+        names = manifestDelta(course, entries) if options.incremental else None
+    if options.incremental and names is None:
+        print(f"no manifest for {course} so extracting all files")
+
+    if options.stream:
+        with profiler.stage("extractToGrade"):
+            destinations = extractToGrade(zipPath, course, options.jobs, names)
+    else:
+        with profiler.stage("checkZip"):
+            zipPath = checkZip(options.jobs, names)
+        with profiler.stage("matchFiles"):
+            destinations = matchFiles(course, names is not None)
+
+    with profiler.stage("manifest"):
+        for name, dest in destinations.items():
+            if name in entries:
+                entries[name]["dest"] = dest
+        writeManifest(course.name(), entries)
 
     # remove submissions.zip unless keep flag specified
     if not options.keepFiles: